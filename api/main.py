@@ -1,18 +1,86 @@
 """FastAPI server for SWAG-Golf Python backend."""
 
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from api.routes import styles, generate, feedback, generations
+from api.services.pipeline import get_pipeline
+from api.utils.middleware import JSONGZipMiddleware
+from api.utils.responses import OrjsonResponse
+from api.utils.static_files import CachedStaticFiles
+
+
+# Worker threads available to sync (def) route handlers
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "64"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Log startup diagnostics, then share one PipelineService for the app's lifetime."""
+    cwd = Path.cwd()
+    print("=" * 60)
+    print("SWAG-Golf Python API Server")
+    print("=" * 60)
+    print(f"Working directory: {cwd}")
+    print(f"Server starting on http://localhost:8000")
+    print("")
+
+    # Verify critical directories exist
+    critical_dirs = {
+        "style/style_library": Path("style/style_library"),
+        "rag/reference_images": Path("rag/reference_images"),
+        "api": Path("api"),
+    }
+    for name, dir_path in critical_dirs.items():
+        resolved = dir_path.resolve()
+        if dir_path.exists():
+            print(f"  [OK] {name}: {resolved}")
+        else:
+            print(f"  [MISSING] {name}: (expected at {resolved})")
+            # Auto-create missing style_library so style creation doesn't fail
+            if name == "style/style_library":
+                dir_path.mkdir(parents=True, exist_ok=True)
+                print(f"    -> Created {resolved}")
+
+    print("")
+    print("Available endpoints:")
+    print("  GET  http://localhost:8000/health")
+    print("  GET  http://localhost:8000/styles")
+    print("  POST http://localhost:8000/generate")
+    print("  POST http://localhost:8000/feedback")
+    print("  POST http://localhost:8000/feedback/summarize")
+    print("  GET  http://localhost:8000/generations")
+    print("  GET  http://localhost:8000/generated/{path} (static files)")
+    print("=" * 60)
+
+    # Ensure output directory exists
+    generated_dir.mkdir(exist_ok=True)
+
+    # The OpenAI and Gemini SDK clients live on this singleton and keep their
+    # own pooled connections, so every request reuses the same upstream sockets
+    pipeline = get_pipeline()
+
+    # Load models and embedding caches now, without holding up startup
+    pipeline.prewarm()
+
+    # Sync routes run on anyio's worker pool (40 by default); style edits
+    # rebuild embeddings there, so give other sync routes room alongside them
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+    await pipeline.aclose()
+
 
 app = FastAPI(
     title="SWAG-Golf Python API",
     description="Backend API for sketch generation pipeline",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=OrjsonResponse,
+    lifespan=lifespan,
 )
 
 # CORS - allow Express API to access this server
@@ -27,15 +95,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON bodies (/generations, /styles, /generate); images and SSE pass through
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024)
+
 # Mount generated images as static files
 generated_dir = Path("generated_outputs")
 if generated_dir.exists():
-    app.mount("/generated", StaticFiles(directory=str(generated_dir)), name="generated")
+    # Output dirs are named by second, so two generations in the same second
+    # write the same sketch_N.png; keep max-age short and let the ETag revalidate
+    app.mount(
+        "/generated",
+        CachedStaticFiles(
+            directory=str(generated_dir),
+            cache_control="public, max-age=60",
+        ),
+        name="generated",
+    )
 
 # Mount reference images as static files
 reference_images_dir = Path("rag/reference_images")
 if reference_images_dir.exists():
-    app.mount("/reference-images", StaticFiles(directory=str(reference_images_dir)), name="reference-images")
+    app.mount("/reference-images", CachedStaticFiles(directory=str(reference_images_dir)), name="reference-images")
 
 
 @app.get("/health")
@@ -62,49 +142,30 @@ app.include_router(feedback.router)
 app.include_router(generations.router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize pipeline service on startup."""
-    cwd = Path.cwd()
-    print("=" * 60)
-    print("SWAG-Golf Python API Server")
-    print("=" * 60)
-    print(f"Working directory: {cwd}")
-    print(f"Server starting on http://localhost:8000")
-    print("")
-
-    # Verify critical directories exist
-    critical_dirs = {
-        "style/style_library": Path("style/style_library"),
-        "rag/reference_images": Path("rag/reference_images"),
-        "api": Path("api"),
-    }
-    for name, dir_path in critical_dirs.items():
-        resolved = dir_path.resolve()
-        if dir_path.exists():
-            print(f"  [OK] {name}: {resolved}")
-        else:
-            print(f"  [MISSING] {name}: (expected at {resolved})")
-            # Auto-create missing style_library so style creation doesn't fail
-            if name == "style/style_library":
-                dir_path.mkdir(parents=True, exist_ok=True)
-                print(f"    -> Created {resolved}")
-
-    print("")
-    print("Available endpoints:")
-    print("  GET  http://localhost:8000/health")
-    print("  GET  http://localhost:8000/styles")
-    print("  POST http://localhost:8000/generate")
-    print("  POST http://localhost:8000/feedback")
-    print("  POST http://localhost:8000/feedback/summarize")
-    print("  GET  http://localhost:8000/generations")
-    print("  GET  http://localhost:8000/generated/{path} (static files)")
-    print("=" * 60)
-
-    # Ensure output directory exists
-    generated_dir.mkdir(exist_ok=True)
-
-
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # uvloop/httptools ship with uvicorn[standard] but uvloop has no Windows
+    # wheels, so fall back to the stdlib loop when it isn't importable.
+    has_uvloop = importlib.util.find_spec("uvloop") is not None
+    has_httptools = importlib.util.find_spec("httptools") is not None
+
+    # Sessions live in-process (SessionStore), so default to a single worker.
+    # Set API_WORKERS to scale out; reload mode requires a single worker.
+    workers = int(os.getenv("API_WORKERS", "1"))
+
+    uvicorn.run(
+        "api.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop" if has_uvloop else "asyncio",
+        http="httptools" if has_httptools else "h11",
+        workers=workers,
+        # Backend only sits behind the local Express proxy, so skip per-request
+        # access logging and X-Forwarded-* parsing unless debugging.
+        access_log=bool(os.getenv("ACCESS_LOG")),
+        proxy_headers=False,
+        server_header=False,
+        date_header=False,
+    )
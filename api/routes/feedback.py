@@ -3,7 +3,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from api.services.pipeline import PipelineService
+from api.services.pipeline import get_pipeline
 
 router = APIRouter()
 
@@ -28,7 +28,7 @@ def submit_feedback(request: FeedbackRequest):
         if not request.feedback or not request.feedback.strip():
             raise HTTPException(status_code=400, detail="Feedback cannot be empty")
 
-        service = PipelineService()
+        service = get_pipeline()
         turn_number, was_summarized = service.add_feedback(
             session_id=request.sessionId,
             style_id=request.styleId,
@@ -57,7 +57,7 @@ def submit_feedback(request: FeedbackRequest):
 def summarize_feedback(request: SummarizeRequest):
     """Trigger GPT summarization of accumulated feedback and persist to style."""
     try:
-        service = PipelineService()
+        service = get_pipeline()
         summary = service.summarize_feedback(
             session_id=request.sessionId,
             style_id=request.styleId
@@ -1,22 +1,39 @@
 """Generate endpoint - runs the full generation pipeline."""
 
-import json
+import asyncio
 import os
 import shutil
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Optional
 
+import orjson
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from api.services.pipeline import PipelineService
+from api.services.generation_index import generation_index
+from api.services.pipeline import get_pipeline
+from api.utils.errors import friendly_error_message
+from api.utils.responses import OrjsonResponse
 
 MAX_GENERATIONS_PER_STYLE = 100
 GENERATED_DIR = Path("generated_outputs")
+# Resolved once at import; relative_to() against it runs per image on every response
+_GENERATED_ROOT = GENERATED_DIR.resolve()
+_GENERATED_ROOT_STR = str(_GENERATED_ROOT)
+
+# Cap on concurrent generations/refines hitting the model backend, and how long a
+# request may queue for a slot before being turned away with 503
+GEN_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "4"))
+GEN_QUEUE_TIMEOUT = float(os.getenv("GEN_QUEUE_TIMEOUT", "30"))
+_GEN_SEM = asyncio.Semaphore(GEN_CONCURRENCY)
 
 router = APIRouter()
 
+# Strong references to in-flight prune tasks so they aren't garbage collected
+_background_tasks = set()
+
 
 class GenerateRequest(BaseModel):
     """Request body for generation endpoint."""
@@ -29,30 +46,105 @@ class GenerateRequest(BaseModel):
 
 def _prune_generations(style_id: str):
     """Delete oldest generation folders for a style beyond MAX_GENERATIONS_PER_STYLE."""
-    if not GENERATED_DIR.exists():
-        return
-
-    # Collect all generation dirs belonging to this style
-    style_dirs = []
-    for entry in sorted(GENERATED_DIR.iterdir(), reverse=True):
-        if not entry.is_dir():
-            continue
-        metadata_path = entry / "metadata.json"
-        if not metadata_path.exists():
-            continue
-        try:
-            with open(metadata_path, "r") as f:
-                meta = json.load(f)
-            if meta.get("style", {}).get("id") == style_id:
-                style_dirs.append(entry)
-        except (json.JSONDecodeError, IOError):
-            continue
+    # Collect all generation dirs belonging to this style (newest-first)
+    style_dirs = generation_index.dirs_for_style(style_id)
 
     # Remove excess (already sorted newest-first)
     for old_dir in style_dirs[MAX_GENERATIONS_PER_STYLE:]:
         shutil.rmtree(old_dir, ignore_errors=True)
 
 
+# Pre-encoded "event: <name>\ndata: " prefixes for the SSE event types we emit
+_SSE_PREFIXES = {
+    name: f"event: {name}\ndata: ".encode()
+    for name in ("progress", "image", "complete", "error")
+}
+
+
+def _sse_frame(event: str, data) -> bytes:
+    """Encode one SSE frame directly to bytes."""
+    prefix = _SSE_PREFIXES.get(event) or f"event: {event}\ndata: ".encode()
+    return prefix + orjson.dumps(data) + b"\n\n"
+
+
+@asynccontextmanager
+async def _generation_slot():
+    """Hold one of GEN_CONCURRENCY generation slots for the duration of the block."""
+    try:
+        await asyncio.wait_for(_GEN_SEM.acquire(), timeout=GEN_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="The server is busy. Please wait a moment and try again.",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        yield
+    finally:
+        _GEN_SEM.release()
+
+
+def _schedule_prune(style_id: str):
+    """Run _prune_generations in a worker thread without holding up the response."""
+    task = asyncio.create_task(asyncio.to_thread(_prune_generations, style_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _build_generate_response(
+    result,
+    style,
+    prompt_spec,
+    reference_images: List[str],
+    retrieval_scores: List[float],
+) -> dict:
+    """Build the /generate and /refine response body (TypeScript GenerateResponse)."""
+    sketches = []
+    for i, image_path in enumerate(result.images):
+        sketch = {
+            "id": f"{result.timestamp}_sketch_{i}",
+            "resolution": list(result.config.resolution),
+            "metadata": {
+                "promptSpec": {
+                    "intent": prompt_spec.intent,
+                    "refinedIntent": prompt_spec.refined_intent,
+                    "negativeConstraints": prompt_spec.negative_constraints or []
+                },
+                "referenceImages": reference_images,
+                "retrievalScores": retrieval_scores
+            }
+        }
+
+        if image_path is not None:
+            # Successful image — include path
+            rel_path = Path(image_path).relative_to(_GENERATED_ROOT)
+            sketch["imagePath"] = f"/generated/{rel_path}"
+        else:
+            # Failed image — include error message
+            sketch["imagePath"] = None
+            sketch["error"] = result.image_errors[i] if i < len(result.image_errors) else "Unknown error"
+
+        sketches.append(sketch)
+
+    return {
+        "success": True,
+        "data": {
+            "timestamp": result.timestamp,
+            "sketches": sketches,
+            "generationMetadata": {
+                "styleId": style.id,
+                "configUsed": {
+                    "numImages": result.config.num_images,
+                    "resolution": list(result.config.resolution),
+                    "outputDir": result.config.output_dir,
+                    "modelName": result.config.model_name,
+                    "seed": result.config.seed
+                }
+            }
+        }
+    }
+
+
 @router.post("/generate")
 async def generate_sketches(request: GenerateRequest):
     """
@@ -73,83 +165,42 @@ async def generate_sketches(request: GenerateRequest):
         if not request.input or not request.input.strip():
             raise HTTPException(status_code=400, detail="Input cannot be empty")
 
-        service = PipelineService()
+        service = get_pipeline()
 
         # Run async pipeline
-        result, prompt_spec, retrieval_result, style = await service.generate_async(
-            user_input=request.input,
-            style_id=request.styleId,
-            num_images=request.numImages or 4,
-            session_id=request.sessionId
+        async with _generation_slot():
+            result, prompt_spec, retrieval_result, style = await service.generate_async(
+                user_input=request.input,
+                style_id=request.styleId,
+                num_images=request.numImages or 4,
+                session_id=request.sessionId
+            )
+
+        # Build response matching TypeScript interface (CPU-bound, keep off the event loop)
+        response = await asyncio.to_thread(
+            _build_generate_response,
+            result, style, prompt_spec,
+            [img.path for img in retrieval_result.images],
+            retrieval_result.scores,
         )
 
-        # Build response matching TypeScript interface
-        sketches = []
-        for i, image_path in enumerate(result.images):
-            sketch = {
-                "id": f"{result.timestamp}_sketch_{i}",
-                "resolution": list(result.config.resolution),
-                "metadata": {
-                    "promptSpec": {
-                        "intent": prompt_spec.intent,
-                        "refinedIntent": prompt_spec.refined_intent,
-                        "negativeConstraints": prompt_spec.negative_constraints or []
-                    },
-                    "referenceImages": [img.path for img in retrieval_result.images],
-                    "retrievalScores": retrieval_result.scores
-                }
-            }
-
-            if image_path is not None:
-                # Successful image — include path
-                rel_path = Path(image_path).relative_to(Path("generated_outputs").resolve())
-                sketch["imagePath"] = f"/generated/{rel_path}"
-            else:
-                # Failed image — include error message
-                sketch["imagePath"] = None
-                sketch["error"] = result.image_errors[i] if i < len(result.image_errors) else "Unknown error"
-
-            sketches.append(sketch)
-
-        response = {
-            "success": True,
-            "data": {
-                "timestamp": result.timestamp,
-                "sketches": sketches,
-                "generationMetadata": {
-                    "styleId": style.id,
-                    "configUsed": {
-                        "numImages": result.config.num_images,
-                        "resolution": list(result.config.resolution),
-                        "outputDir": result.config.output_dir,
-                        "modelName": result.config.model_name,
-                        "seed": result.config.seed
-                    }
-                }
-            }
-        }
-
         # Prune old generations for this style to keep only the most recent 100
-        _prune_generations(request.styleId)
+        _schedule_prune(request.styleId)
 
-        return response
+        # Already plain JSON types; returning a Response skips jsonable_encoder
+        return OrjsonResponse(response)
 
     except HTTPException:
         raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        error_str = str(e).lower()
         print(f"[Generate] Error: {e}")  # Log real error server-side
-        if '429' in error_str or 'rate' in error_str or 'quota' in error_str or 'busy' in error_str:
-            friendly = "The server is busy. Please wait a moment and try again."
-        else:
-            friendly = "Something went wrong during generation. Please try again."
         return {
             "success": False,
             "error": {
                 "code": "GENERATION_ERROR",
-                "message": friendly
+                "message": friendly_error_message(e, "generation")
             }
         }
 
@@ -168,29 +219,26 @@ async def generate_sketches_stream(request: GenerateRequest):
     if not request.input or not request.input.strip():
         raise HTTPException(status_code=400, detail="Input cannot be empty")
 
-    service = PipelineService()
+    service = get_pipeline()
 
     async def event_generator():
         try:
-            async for event in service.generate_streaming(
-                user_input=request.input,
-                style_id=request.styleId,
-                num_images=request.numImages or 4,
-                session_id=request.sessionId
-            ):
-                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+            async with _generation_slot():
+                async for event in service.generate_streaming(
+                    user_input=request.input,
+                    style_id=request.styleId,
+                    num_images=request.numImages or 4,
+                    session_id=request.sessionId
+                ):
+                    yield _sse_frame(event["event"], event["data"])
 
             # Prune after completion
-            _prune_generations(request.styleId)
+            _schedule_prune(request.styleId)
 
         except Exception as e:
-            error_str = str(e).lower()
             print(f"[Generate-Stream] Error: {e}")  # Log real error server-side
-            if '429' in error_str or 'rate' in error_str or 'quota' in error_str or 'busy' in error_str:
-                friendly = "The server is busy. Please wait a moment and try again."
-            else:
-                friendly = "Something went wrong during generation. Please try again."
-            yield f"event: error\ndata: {json.dumps({'message': friendly})}\n\n"
+            friendly = friendly_error_message(e, "generation")
+            yield _sse_frame("error", {"message": friendly})
 
     return StreamingResponse(
         event_generator(),
@@ -213,15 +261,14 @@ class RefineRequest(BaseModel):
 
 def _resolve_image_path(relative_url: str) -> str:
     """Convert /generated/timestamp/sketch.png to absolute path under generated_outputs/."""
-    rel_part = relative_url.replace("/generated/", "", 1)
-    abs_path = Path("generated_outputs").resolve() / rel_part
-    if not abs_path.exists():
+    abs_path = os.path.join(_GENERATED_ROOT_STR, relative_url.removeprefix("/generated/"))
+    if not os.path.exists(abs_path):
         raise ValueError(f"Image not found: {abs_path}")
-    return str(abs_path)
+    return abs_path
 
 
 @router.post("/refine")
-def refine_sketches(request: RefineRequest):
+async def refine_sketches(request: RefineRequest):
     """
     Refine existing sketch images by applying modification instructions.
 
@@ -241,80 +288,39 @@ def refine_sketches(request: RefineRequest):
         for rel_url in request.selectedImagePaths:
             resolved_paths.append(_resolve_image_path(rel_url))
 
-        service = PipelineService()
+        service = get_pipeline()
 
-        # Run refine pipeline
-        result, style = service.refine(
-            refine_prompt=request.refinePrompt,
-            selected_image_paths=resolved_paths,
-            style_id=request.styleId,
-            session_id=request.sessionId,
-        )
+        # Run async refine pipeline (same Gemini image calls, so same slot limit)
+        async with _generation_slot():
+            result, style = await service.refine_async(
+                refine_prompt=request.refinePrompt,
+                selected_image_paths=resolved_paths,
+                style_id=request.styleId,
+                session_id=request.sessionId,
+            )
 
         # Build response matching TypeScript GenerateResponse interface
-        sketches = []
-        for i, image_path in enumerate(result.images):
-            sketch = {
-                "id": f"{result.timestamp}_sketch_{i}",
-                "resolution": list(result.config.resolution),
-                "metadata": {
-                    "promptSpec": {
-                        "intent": result.prompt_spec.intent,
-                        "refinedIntent": result.prompt_spec.refined_intent,
-                        "negativeConstraints": result.prompt_spec.negative_constraints or []
-                    },
-                    "referenceImages": resolved_paths,
-                    "retrievalScores": []
-                }
-            }
-
-            if image_path is not None:
-                rel_path = Path(image_path).relative_to(Path("generated_outputs").resolve())
-                sketch["imagePath"] = f"/generated/{rel_path}"
-            else:
-                sketch["imagePath"] = None
-                sketch["error"] = result.image_errors[i] if i < len(result.image_errors) else "Unknown error"
-
-            sketches.append(sketch)
-
-        response = {
-            "success": True,
-            "data": {
-                "timestamp": result.timestamp,
-                "sketches": sketches,
-                "generationMetadata": {
-                    "styleId": style.id,
-                    "configUsed": {
-                        "numImages": result.config.num_images,
-                        "resolution": list(result.config.resolution),
-                        "outputDir": result.config.output_dir,
-                        "modelName": result.config.model_name,
-                        "seed": result.config.seed
-                    }
-                }
-            }
-        }
+        response = await asyncio.to_thread(
+            _build_generate_response,
+            result, style, result.prompt_spec, resolved_paths, [],
+        )
 
-        _prune_generations(request.styleId)
+        _schedule_prune(request.styleId)
 
-        return response
+        # Already plain JSON types; returning a Response skips jsonable_encoder
+        return OrjsonResponse(response)
 
     except HTTPException:
         raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        error_str = str(e).lower()
         print(f"[Refine] Error: {e}")  # Log real error server-side
-        if '429' in error_str or 'rate' in error_str or 'quota' in error_str or 'busy' in error_str:
-            friendly = "The server is busy. Please wait a moment and try again."
-        else:
-            friendly = "Something went wrong during refinement. Please try again."
         return {
             "success": False,
             "error": {
                 "code": "REFINE_ERROR",
-                "message": friendly
+                "message": friendly_error_message(e, "refinement")
             }
         }
 
@@ -341,28 +347,25 @@ async def refine_sketches_stream(request: RefineRequest):
     for rel_url in request.selectedImagePaths:
         resolved_paths.append(_resolve_image_path(rel_url))
 
-    service = PipelineService()
+    service = get_pipeline()
 
     async def event_generator():
         try:
-            async for event in service.refine_streaming(
-                refine_prompt=request.refinePrompt,
-                selected_image_paths=resolved_paths,
-                style_id=request.styleId,
-                session_id=request.sessionId
-            ):
-                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+            async with _generation_slot():
+                async for event in service.refine_streaming(
+                    refine_prompt=request.refinePrompt,
+                    selected_image_paths=resolved_paths,
+                    style_id=request.styleId,
+                    session_id=request.sessionId
+                ):
+                    yield _sse_frame(event["event"], event["data"])
 
-            _prune_generations(request.styleId)
+            _schedule_prune(request.styleId)
 
         except Exception as e:
-            error_str = str(e).lower()
             print(f"[Refine-Stream] Error: {e}")
-            if '429' in error_str or 'rate' in error_str or 'quota' in error_str or 'busy' in error_str:
-                friendly = "The server is busy. Please wait a moment and try again."
-            else:
-                friendly = "Something went wrong during refinement. Please try again."
-            yield f"event: error\ndata: {json.dumps({'message': friendly})}\n\n"
+            friendly = friendly_error_message(e, "refinement")
+            yield _sse_frame("error", {"message": friendly})
 
     return StreamingResponse(
         event_generator(),
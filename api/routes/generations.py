@@ -1,20 +1,88 @@
 """Generations history endpoint - returns all past generation metadata."""
 
+import asyncio
+import itertools
 import json
+import os
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
 from api.utils.case_converter import convert_keys_to_camel
+from api.utils.metadata import read_all_metadata
+from api.utils.responses import OrjsonResponse
 
 router = APIRouter()
 
 GENERATED_DIR = Path("generated_outputs")
 
+# Camel-cased history keyed on a version and generated_outputs/ mtime. Adding
+# or pruning a generation dir bumps the mtime; new dirs are written with
+# archived=False and only become visible via confirm_generation, which rewrites
+# metadata.json in place (no mtime change) and so bumps the version instead.
+# "entry" is a (version, mtime_ns, generations) tuple, replaced in one assignment.
+_cache: Dict[str, Any] = {"version": 0, "entry": None}
+_versions = itertools.count(1)
+
+
+def _invalidate_cache():
+    # next() on a count is atomic, unlike += from concurrent threadpool routes
+    _cache["version"] = next(_versions)
+
+
+def _get_generations() -> List[Dict[str, Any]]:
+    """Return all visible generations (camelCase, newest-first), rescanning only on change."""
+    version = _cache["version"]
+    try:
+        mtime_ns = os.stat(GENERATED_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return []
+
+    entry = _cache["entry"]
+    if entry is not None and entry[0] == version and entry[1] == mtime_ns:
+        return entry[2]
+
+    generations = [convert_keys_to_camel(g) for g in _scan_generations()]
+    # A confirm that landed mid-scan may not be in this list; don't cache it
+    if _cache["version"] == version:
+        _cache["entry"] = (version, mtime_ns, generations)
+    return generations
+
+
+def _scan_generations() -> List[Dict[str, Any]]:
+    """Walk generated_outputs/ and collect normalized metadata, newest-first."""
+    generations = []
+    for entry, meta in read_all_metadata(GENERATED_DIR):
+        # Skip unconfirmed entries (cancelled generations)
+        # Old entries without "archived" field are shown for backwards compat
+        if meta.get("archived") is False:
+            continue
+
+        # Normalize legacy vs current schema
+        mode = meta.get("mode", "generate")
+        user_prompt = meta.get("user_prompt") or meta.get("refine_prompt") or meta.get("prompt", "")
+        if not user_prompt:
+            continue
+
+        style_info = meta.get("style", {"id": "unknown", "name": "Unknown"})
+        images = meta.get("images", [])
+
+        generations.append({
+            "timestamp": meta.get("timestamp", entry.name),
+            "dir_name": entry.name,
+            "user_prompt": user_prompt,
+            "mode": mode,
+            "style": style_info,
+            "image_count": len(images),
+            "images": images,
+        })
+
+    return generations
+
 
 @router.get("/generations")
-def list_generations(
+async def list_generations(
     style_id: Optional[str] = Query(None, alias="styleId"),
 ):
     """
@@ -24,60 +92,22 @@ def list_generations(
     Returns newest-first ordering.
     """
     try:
-        if not GENERATED_DIR.exists():
-            return {"success": True, "total": 0, "generations": []}
-
-        generations = []
-        for entry in sorted(GENERATED_DIR.iterdir(), reverse=True):
-            if not entry.is_dir():
-                continue
-            metadata_path = entry / "metadata.json"
-            if not metadata_path.exists():
-                continue
-
-            try:
-                with open(metadata_path, "r") as f:
-                    meta = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                continue
-
-            # Skip unconfirmed entries (cancelled generations)
-            # Old entries without "archived" field are shown for backwards compat
-            if meta.get("archived") is False:
-                continue
-
-            # Normalize legacy vs current schema
-            mode = meta.get("mode", "generate")
-            user_prompt = meta.get("user_prompt") or meta.get("refine_prompt") or meta.get("prompt", "")
-            if not user_prompt:
-                continue
-
-            style_info = meta.get("style", {"id": "unknown", "name": "Unknown"})
-            images = meta.get("images", [])
-
-            # Filter by style if requested
-            if style_id and style_info.get("id") != style_id:
-                continue
-
-            generations.append({
-                "timestamp": meta.get("timestamp", entry.name),
-                "dir_name": entry.name,
-                "user_prompt": user_prompt,
-                "mode": mode,
-                "style": style_info,
-                "image_count": len(images),
-                "images": images,
-            })
+        # Directory walk and metadata reads block, so keep them off the event loop
+        generations = await asyncio.to_thread(_get_generations)
+
+        # Filter by style if requested
+        if style_id:
+            generations = [g for g in generations if g["style"].get("id") == style_id]
 
         # Cap at 100 most recent generations (per-style when filtered, global otherwise)
         generations = generations[:100]
         total = len(generations)
 
-        return {
+        return OrjsonResponse({
             "success": True,
             "total": total,
-            "generations": [convert_keys_to_camel(g) for g in generations],
-        }
+            "generations": generations,
+        })
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -101,6 +131,8 @@ def confirm_generation(dir_name: str):
         with open(metadata_path, "w") as f:
             json.dump(meta, f, indent=2)
 
+        _invalidate_cache()
+
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
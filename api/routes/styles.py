@@ -1,17 +1,29 @@
 """Styles endpoint - returns available styles from StyleRegistry."""
 
-import json
+import asyncio
+import functools
+import hashlib
+import inspect
+import itertools
 import os
-import shutil
-import tempfile
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+import orjson
+from fastapi import APIRouter, File, Form, HTTPException, Request, Response, UploadFile
 from pydantic import BaseModel
 
-from api.services.pipeline import PipelineService
+from api.services.pipeline import get_pipeline
 from api.utils.case_converter import convert_keys_to_camel
+from api.utils.responses import OrjsonResponse
+from style.init_style import SUPPORTED_FORMATS
+
+
+class CreateStyleRequest(BaseModel):
+    name: str
+    description: str = ""
+    visual_rules: dict = {}
 
 
 class UpdateStyleRequest(BaseModel):
@@ -25,9 +37,135 @@ class DeleteImagesRequest(BaseModel):
 
 router = APIRouter()
 
+# Singleton, bound once; it loads its models lazily on first use
+_service = get_pipeline()
+
+STYLE_LIBRARY_DIR = Path("style/style_library")
+
+# Cap on upload requests holding image bytes / embedding at once, and how long
+# a request may queue for a slot before being turned away with 503
+UPLOAD_CONCURRENCY_LIMIT = int(os.getenv("UPLOAD_CONCURRENCY_LIMIT", "10"))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "30"))
+_UPLOAD_SEM = asyncio.Semaphore(UPLOAD_CONCURRENCY_LIMIT)
+
+# Reference image types the style validators and indexers pick up
+_ALLOWED_SUFFIXES = frozenset(suffix.lower() for suffix in SUPPORTED_FORMATS)
+
+# Serialized GET /styles body and its ETag. Mutating routes bump "version";
+# the style_library/ mtime also catches styles added or removed out-of-band.
+# "entry" is a (key, etag, body) tuple, replaced in one assignment so threadpool
+# readers never pair a new key with a stale body or ETag.
+_cache: Dict[str, Any] = {"version": 0, "entry": None}
+_versions = itertools.count(1)
+
+
+def _invalidate_cache():
+    # next() on a count is atomic, unlike += from concurrent threadpool routes
+    _cache["version"] = next(_versions)
+
+
+@asynccontextmanager
+async def _upload_slot():
+    """Hold one of UPLOAD_CONCURRENCY_LIMIT slots, or fail with 503 after UPLOAD_QUEUE_TIMEOUT."""
+    try:
+        await asyncio.wait_for(_UPLOAD_SEM.acquire(), timeout=UPLOAD_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail="The server is busy. Please wait a moment and try again.",
+            headers={"Retry-After": "5"},
+        )
+    try:
+        yield
+    finally:
+        _UPLOAD_SEM.release()
+
+
+def _service_errors(value_error_status: int) -> Callable:
+    """
+    Map service failures in a route to HTTP errors.
+
+    ValueError from the service becomes `value_error_status`, HTTPExceptions
+    pass through, and anything else is a 500. Sync handlers stay sync so
+    FastAPI still runs them on its threadpool.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                try:
+                    return await fn(*args, **kwargs)
+                except HTTPException:
+                    raise
+                except ValueError as e:
+                    raise HTTPException(status_code=value_error_status, detail=str(e))
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=str(e))
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                try:
+                    return fn(*args, **kwargs)
+                except HTTPException:
+                    raise
+                except ValueError as e:
+                    raise HTTPException(status_code=value_error_status, detail=str(e))
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=str(e))
+        return wrapper
+    return decorate
+
+
+async def _read_uploads(uploads: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """
+    Read all uploads concurrently as (filename, content) pairs, in upload order.
+
+    Unsupported file types are rejected with 415 before any upload is read.
+    """
+    filenames = [upload.filename or "image.png" for upload in uploads]
+    for filename in filenames:
+        suffix = Path(filename).suffix.lower()
+        if suffix not in _ALLOWED_SUFFIXES:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Unsupported image type '{suffix or filename}'. "
+                       f"Supported formats: {', '.join(sorted(_ALLOWED_SUFFIXES))}",
+            )
+
+    contents = await asyncio.gather(*(upload.read() for upload in uploads))
+
+    # Drop Starlette's spooled temp files now rather than after the rebuild
+    await asyncio.gather(*(upload.close() for upload in uploads))
+    return list(zip(filenames, contents))
+
+
+def _style_to_camel(style) -> Dict[str, Any]:
+    """
+    Build the camelCase Style payload the frontend expects.
+
+    The top-level keys are a fixed schema, so they are written camelCased
+    directly; only the free-form visual_rules still goes through the converter.
+    """
+    return {
+        "id": style.id,
+        "name": style.name,
+        "description": style.description,
+        "visualRules": convert_keys_to_camel(style.visual_rules),
+        "referenceImages": style.reference_image_names,
+        "doNotUse": [],
+    }
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
 
 @router.get("/styles")
-def get_styles():
+def get_styles(request: Request):
     """
     Return all available styles from the StyleRegistry.
 
@@ -45,30 +183,45 @@ def get_styles():
             }
         ]
     }
+
+    The body is serialized once per change and sent with a strong ETag;
+    a matching If-None-Match gets a bodiless 304.
     """
     try:
-        service = PipelineService()
-        styles = service.get_all_styles()
-
-        styles_data = []
-        for style in styles:
-            style_dict = {
-                "id": style.id,
-                "name": style.name,
-                "description": style.description,
-                "visual_rules": style.visual_rules,
-                "reference_images": [os.path.basename(p) for p in style.reference_images],
-                "do_not_use": []
-            }
-            styles_data.append(convert_keys_to_camel(style_dict))
-
-        return {"success": True, "styles": styles_data}
+        try:
+            mtime_ns = os.stat(STYLE_LIBRARY_DIR).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        key = (_cache["version"], mtime_ns)
+
+        entry = _cache["entry"]
+        if entry is None or entry[0] != key:
+            styles = _service.get_all_styles()
+
+            # Encode style by style into the envelope so only one camelCase
+            # dict is alive at a time, not the whole list alongside its bytes
+            body = b"".join((
+                b'{"success":true,"styles":[',
+                b",".join(orjson.dumps(_style_to_camel(style)) for style in styles),
+                b"]}",
+            ))
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            entry = (key, etag, body)
+            _cache["entry"] = entry
+
+        _, etag, body = entry
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 
 @router.post("/styles")
+@_service_errors(409)
 async def create_style(
     name: str = Form(...),
     description: str = Form(""),
@@ -79,163 +232,118 @@ async def create_style(
     Create a new style with optional reference images.
     Builds embeddings if images are provided.
     """
-    tmp_dir = None
-    try:
-        service = PipelineService()
-
-        # Parse visual_rules JSON string
+    async with _upload_slot():
+        # Parse visual_rules JSON string (the form default needs no parse)
         try:
-            rules = json.loads(visual_rules)
-        except json.JSONDecodeError:
+            rules = orjson.loads(visual_rules) if visual_rules != "{}" else {}
+        except orjson.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Invalid visual_rules JSON")
 
-        # Save uploaded files to temp directory (if any)
-        saved_files: List[Path] = []
-        if images:
-            tmp_dir = Path(tempfile.mkdtemp(prefix="swag_create_"))
-            for upload in images:
-                suffix = Path(upload.filename or "image.png").suffix.lower()
-                dest = tmp_dir / f"{len(saved_files)}{suffix}"
-                with open(dest, "wb") as f:
-                    content = await upload.read()
-                    f.write(content)
-                saved_files.append(dest)
-
-        style = service.create_style(
+        # Uploads go to the service in memory; it writes them into the store
+        image_blobs = await _read_uploads(images) if images else None
+
+        # Writing images and embedding them is slow; keep it off the event loop
+        style = await asyncio.to_thread(
+            _service.create_style,
             name=name,
             description=description,
             visual_rules=rules,
-            image_files=saved_files or None,
+            image_blobs=image_blobs,
         )
+        _invalidate_cache()
 
-        style_dict = {
-            "id": style.id,
-            "name": style.name,
-            "description": style.description,
-            "visual_rules": style.visual_rules,
-            "reference_images": [os.path.basename(p) for p in style.reference_images],
-            "do_not_use": [],
-        }
-
-        return {"success": True, "style": convert_keys_to_camel(style_dict)}
-
-    except ValueError as e:
-        raise HTTPException(status_code=409, detail=str(e))
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if tmp_dir and tmp_dir.exists():
-            shutil.rmtree(str(tmp_dir), ignore_errors=True)
+    # Already plain JSON types; returning a Response skips jsonable_encoder
+    return OrjsonResponse({"success": True, "style": _style_to_camel(style)})
+
+
+@router.post("/styles/json")
+@_service_errors(409)
+def create_style_json(request: CreateStyleRequest):
+    """
+    Create a new style without reference images from a JSON body.
+
+    Same result as POST /styles, but visual_rules arrives as a native object
+    instead of a JSON string inside a multipart form.
+    """
+    style = _service.create_style(
+        name=request.name,
+        description=request.description,
+        visual_rules=request.visual_rules,
+    )
+    _invalidate_cache()
+
+    # Already plain JSON types; returning a Response skips jsonable_encoder
+    return OrjsonResponse({"success": True, "style": _style_to_camel(style)})
 
 
 @router.post("/styles/{style_id}/images")
+@_service_errors(404)
 async def add_images_to_style(style_id: str, images: List[UploadFile] = File(...)):
     """
     Add images to an existing style. Skips duplicates by content hash.
     Rebuilds embeddings after adding.
     """
-    tmp_dir = None
-    try:
-        service = PipelineService()
-
-        # Save uploaded files to temp directory
-        tmp_dir = Path(tempfile.mkdtemp(prefix="swag_upload_"))
-        saved_files: List[Path] = []
-        for upload in images:
-            suffix = Path(upload.filename or "image.png").suffix.lower()
-            dest = tmp_dir / f"{len(saved_files)}{suffix}"
-            with open(dest, "wb") as f:
-                content = await upload.read()
-                f.write(content)
-            saved_files.append(dest)
-
-        result = service.add_images_to_style(style_id, saved_files)
-        return {"success": True, **result}
-
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if tmp_dir and tmp_dir.exists():
-            shutil.rmtree(str(tmp_dir), ignore_errors=True)
+    async with _upload_slot():
+        # Duplicates are dropped in memory; only novel images reach the disk
+        image_blobs = await _read_uploads(images)
+
+        result = await asyncio.to_thread(
+            _service.add_images_to_style, style_id, image_blobs=image_blobs
+        )
+        _invalidate_cache()
+
+    return OrjsonResponse({"success": True, **result})
 
 
 @router.put("/styles/{style_id}")
+@_service_errors(404)
 def update_style(style_id: str, request: UpdateStyleRequest):
     """
     Update style metadata (name, description, visual_rules).
     """
-    try:
-        service = PipelineService()
-
-        updates = {}
-        if request.name is not None:
-            updates["name"] = request.name
-        if request.description is not None:
-            updates["description"] = request.description
-        if request.visual_rules is not None:
-            updates["visual_rules"] = request.visual_rules
-
-        if not updates:
-            raise HTTPException(status_code=400, detail="No fields to update")
-
-        style = service.update_style(style_id, updates)
-
-        style_dict = {
-            "id": style.id,
-            "name": style.name,
-            "description": style.description,
-            "visual_rules": style.visual_rules,
-            "reference_images": [os.path.basename(p) for p in style.reference_images],
-            "do_not_use": [],
-        }
-
-        return {"success": True, "style": convert_keys_to_camel(style_dict)}
-
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    updates = {}
+    if request.name is not None:
+        updates["name"] = request.name
+    if request.description is not None:
+        updates["description"] = request.description
+    if request.visual_rules is not None:
+        updates["visual_rules"] = request.visual_rules
+
+    if not updates:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    style = _service.update_style(style_id, updates)
+    _invalidate_cache()
+
+    # Already plain JSON types; returning a Response skips jsonable_encoder
+    return OrjsonResponse({"success": True, "style": _style_to_camel(style)})
 
 
 @router.delete("/styles/{style_id}")
+@_service_errors(404)
 def delete_style(style_id: str):
     """
     Delete a style and all its associated reference images and embedding cache.
     """
-    try:
-        service = PipelineService()
-        deleted_count = service.delete_style(style_id)
-        return {
-            "success": True,
-            "message": f"Deleted style '{style_id}' and {deleted_count} reference images"
-        }
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    deleted_count = _service.delete_style(style_id)
+    _invalidate_cache()
+    return OrjsonResponse({
+        "success": True,
+        "message": f"Deleted style '{style_id}' and {deleted_count} reference images"
+    })
 
 
 @router.delete("/styles/{style_id}/images")
+@_service_errors(404)
 def delete_images_from_style(style_id: str, request: DeleteImagesRequest):
     """
     Delete specific reference images from a style.
     Rebuilds embeddings after deletion.
     """
-    try:
-        service = PipelineService()
-        deleted_count = service.delete_images_from_style(style_id, request.filenames)
-        return {
-            "success": True,
-            "deleted": deleted_count,
-            "message": f"Deleted {deleted_count} image(s) from style '{style_id}'"
-        }
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    deleted_count = _service.delete_images_from_style(style_id, request.filenames)
+    _invalidate_cache()
+    return OrjsonResponse({
+        "success": True,
+        "deleted": deleted_count,
+        "message": f"Deleted {deleted_count} image(s) from style '{style_id}'"
+    })
@@ -0,0 +1,58 @@
+"""In-memory index of generation output dirs by style."""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+from api.utils.metadata import read_metadata_many
+
+
+class GenerationIndex:
+    """
+    Maps generation dir name -> style_id for everything under generated_outputs/.
+
+    Each refresh lists the directory once and only reads metadata.json for dirs
+    it hasn't seen before, so per-style lookups cost O(new dirs) reads instead of
+    re-reading every generation on disk. The first refresh in a process is a
+    full scan. Dirs whose metadata isn't written yet are retried next refresh.
+    """
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = base_dir
+        self._style_by_dir: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """Sync the index with the directories currently on disk."""
+        try:
+            with os.scandir(self.base_dir) as it:
+                names = [entry.name for entry in it if entry.is_dir()]
+        except FileNotFoundError:
+            names = []
+
+        with self._lock:
+            new_names = [name for name in names if name not in self._style_by_dir]
+
+        metas = read_metadata_many([self.base_dir / name for name in new_names])
+
+        with self._lock:
+            present = set(names)
+            style_by_dir = {
+                name: style_id for name, style_id in self._style_by_dir.items()
+                if name in present
+            }
+            for name, meta in zip(new_names, metas):
+                if meta is not None:
+                    style_by_dir[name] = meta.get("style", {}).get("id")
+            self._style_by_dir = style_by_dir
+
+    def dirs_for_style(self, style_id: str) -> List[Path]:
+        """Return generation dirs belonging to style_id, newest-first."""
+        self.refresh()
+        with self._lock:
+            names = [name for name, sid in self._style_by_dir.items() if sid == style_id]
+        return [self.base_dir / name for name in sorted(names, reverse=True)]
+
+
+generation_index = GenerationIndex(Path("generated_outputs"))
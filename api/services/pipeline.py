@@ -1,11 +1,16 @@
 """Pipeline service that orchestrates the generation workflow."""
 
 import asyncio
+import dataclasses
 import json
 import os
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import orjson
 from dotenv import load_dotenv
 
 from style.registry import StyleRegistry
@@ -15,17 +20,19 @@ from style.init_style import delete_images_from_style as fs_delete_images_from_s
 from style.init_style import add_images_to_existing_style
 from style.init_style import create_new_style, slugify, DEFAULT_VISUAL_RULES
 from style.init_style import update_style_json
-from prompt.compiler import PromptCompiler
 from prompt.schema import PromptSpec
-from rag.embedder import ImageEmbedder
-from rag.index import IndexRegistry
-from rag.retriever import ImageRetriever
 from rag.types import RetrievalResult
-from generate.generator import ImageGenerator
 from generate.types import GenerationConfig, GenerationResult
-from feedback.session import SessionStore, ConversationTurn
+from generate.utils import save_metadata, get_timestamp
+from feedback.session import SessionStore, ConversationContext, ConversationTurn
 from feedback.logger import ConversationLogger
 
+# Worker threads for GPT prompt compilation (network-bound) and for RAG
+# retrieval / embedding loads (CPU-bound CLIP), kept apart so slow GPT calls
+# can't hold up retrieval and bursts of retrieval don't oversubscribe the CPU
+GPT_POOL_SIZE = int(os.getenv("GPT_POOL_SIZE", "16"))
+RAG_POOL_SIZE = int(os.getenv("RAG_POOL_SIZE", str(os.cpu_count() or 4)))
+
 
 class PipelineService:
     """
@@ -35,28 +42,79 @@ class PipelineService:
 
     _instance = None
 
+    # Held while the instance or its components are constructed, so a request
+    # arriving mid prewarm() waits for that build instead of starting a second one
+    _init_lock = threading.RLock()
+
+    # Class-level defaults, so the init guards are plain attribute reads
+    _initialized = False
+    style_registry: Optional[StyleRegistry] = None
+
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
+            with cls._init_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
         return cls._instance
 
-    def _initialize(self):
-        """Lazy initialization of pipeline components."""
-        if self._initialized:
+    def _init_styles(self):
+        """
+        Set up only what style CRUD needs: the registry and the per-style locks.
+
+        Importing the compiler, embedder and generator pulls in openai, torch
+        and the Gemini SDK, so routes that only read or edit style metadata
+        never pay for that.
+        """
+        if self.style_registry is not None:
             return
+        with self._init_lock:
+            if self.style_registry is None:
+                self._build_styles()
 
+    def _build_styles(self):
         load_dotenv()
 
+        # Per-style locks: one serializes on-disk edits, one serializes index
+        # rebuilds. Edit versions let a queued rebuild see that a newer one
+        # already covered its change and skip the duplicate work.
+        self._style_locks: Dict[str, threading.Lock] = {}
+        self._rebuild_locks: Dict[str, threading.Lock] = {}
+        self._edit_versions: Dict[str, int] = {}
+        self._built_versions: Dict[str, int] = {}
+
         # Initialize style registry
         self.style_registry = StyleRegistry()
 
-        # Initialize prompt compiler
-        gpt_model = os.getenv("GPT_MODEL", "gpt-4o-mini")
-        self.compiler = PromptCompiler(model=gpt_model)
+    def _initialize(self):
+        """Lazy initialization of pipeline components."""
+        if self._initialized:
+            return
+        with self._init_lock:
+            if not self._initialized:
+                self._build_components()
+
+    def _build_components(self):
+        self._init_styles()
+
+        # The embedding model (torch) and the image generator (Gemini SDK) are
+        # the slow parts and don't depend on each other, so both are imported
+        # and built on worker threads while the prompt compiler is set up here
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-init") as pool:
+            embedder_future = pool.submit(_load_embedder)
+            generator_future = pool.submit(_load_generator)
+
+            # Initialize prompt compiler
+            from prompt.compiler import PromptCompiler
+            gpt_model = os.getenv("GPT_MODEL", "gpt-4o-mini")
+            self.compiler = PromptCompiler(model=gpt_model)
+
+            self.embedder = embedder_future.result()
+            self.generator = generator_future.result()
+
+        from rag.index import IndexRegistry
+        from rag.retriever import ImageRetriever
 
         # Initialize RAG components
-        self.embedder = ImageEmbedder()
         self.index_registry = IndexRegistry(
             self.style_registry,
             self.embedder,
@@ -64,23 +122,141 @@ class PipelineService:
         )
         self.retriever = ImageRetriever(self.index_registry, self.embedder)
 
-        # Initialize image generator
-        self.generator = ImageGenerator()
+        self._gpt_pool = ThreadPoolExecutor(max_workers=GPT_POOL_SIZE, thread_name_prefix="gpt")
+        self._rag_pool = ThreadPoolExecutor(max_workers=RAG_POOL_SIZE, thread_name_prefix="rag")
 
         # Initialize session and feedback logging
         self.session_store = SessionStore()
         self.conversation_logger = ConversationLogger()
 
+        # Settings shared by every request; only num_images varies. Built after
+        # load_dotenv() so model_name picks up GEMINI_MODEL from .env
+        self._config_template = GenerationConfig(
+            resolution=(1024, 1024),
+            output_dir="generated_outputs"
+        )
+
         self._initialized = True
 
+    def prewarm(self) -> threading.Thread:
+        """
+        Build the pipeline in a background thread so the first request doesn't.
+
+        Besides constructing the components, runs one text embedding (the first
+        forward pass is the slow one) and loads each style's cached embeddings.
+        """
+        def warm():
+            try:
+                self._initialize()
+                self.embedder.embed_text("golf concept sketch")
+                for style in self.style_registry.get_all_styles():
+                    self._preload_embeddings(style.id)
+                print("[OK] Pipeline prewarmed")
+            except Exception as e:
+                # Not fatal: the first request retries initialization itself
+                print(f"[Prewarm] Failed: {e}")
+
+        thread = threading.Thread(target=warm, name="pipeline-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def _preload_embeddings(self, style_id: str) -> None:
+        """Load a style's cached embeddings so retrieval finds them in memory."""
+        try:
+            self.index_registry.get_index(style_id).get_embeddings()
+        except ValueError:
+            # No cache built yet; retrieve() raises this itself when it runs
+            pass
+
+    def _generation_config(self, num_images: int) -> GenerationConfig:
+        return dataclasses.replace(self._config_template, num_images=num_images)
+
+    def close(self) -> None:
+        """Close the upstream API clients, release pooled connections and worker threads, and flush the conversation log."""
+        if not self._initialized:
+            return
+
+        self._gpt_pool.shutdown(wait=False, cancel_futures=True)
+        self._rag_pool.shutdown(wait=False, cancel_futures=True)
+        self.conversation_logger.close()
+        self.compiler.client.close()
+        gemini = getattr(self.generator.adapter, "client", None)
+        if gemini is not None:
+            gemini.close()
+
+    async def aclose(self) -> None:
+        """close(), plus the Gemini client's async session used by the async/streaming paths."""
+        if not self._initialized:
+            return
+
+        self.close()
+        gemini = getattr(self.generator.adapter, "client", None)
+        if gemini is not None:
+            await gemini.aclose()
+
+    def _style_lock(self, style_id: str) -> threading.Lock:
+        return self._style_locks.setdefault(style_id, threading.Lock())
+
+    def _mark_edited(self, style_id: str) -> int:
+        """Record a change to a style's images (call under its style lock); returns the new version."""
+        version = self._edit_versions.get(style_id, 0) + 1
+        self._edit_versions[style_id] = version
+        return version
+
+    def _rebuild_index(
+        self,
+        style_id: str,
+        version: int,
+        added_paths: Optional[List[str]] = None,
+        removed_names: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Bring a style's embeddings up to date with the edit recorded as `version`.
+
+        Rebuilds for one style run one at a time. A caller that queued behind a
+        rebuild which already picked up its edit returns without rebuilding.
+        When the index already reflects every earlier edit, an edit that only
+        added `added_paths` embeds and appends just those images, and one that
+        only deleted `removed_names` drops just their entries.
+        """
+        self._initialize()
+
+        with self._rebuild_locks.setdefault(style_id, threading.Lock()):
+            built = self._built_versions.get(style_id, 0)
+            if built >= version:
+                return
+
+            if added_paths and built == version - 1:
+                self.index_registry.get_index(style_id).add_images(added_paths)
+                self._built_versions[style_id] = version
+                return
+
+            if removed_names and built == version - 1:
+                self.index_registry.get_index(style_id).remove_images(removed_names)
+                self._built_versions[style_id] = version
+                return
+
+            target = self._edit_versions.get(style_id, version)
+
+            # Rebuild in place if any images remain: surviving images keep the
+            # vectors the live index already holds (no cache re-read), and only
+            # new ones are embedded. Otherwise drop the now-stale index.
+            style = self.style_registry.get_style(style_id)
+            if style.reference_images:
+                self.index_registry.get_index(style_id).build_index(reuse_cached=True)
+            else:
+                self.index_registry._indices.pop(style_id, None)
+
+            self._built_versions[style_id] = target
+
     def get_all_styles(self) -> List[Style]:
         """Return all available styles from the registry."""
-        self._initialize()
+        self._init_styles()
         return self.style_registry.get_all_styles()
 
     def get_style(self, style_id: str) -> Style:
         """Return a specific style by ID."""
-        self._initialize()
+        self._init_styles()
         return self.style_registry.get_style(style_id)
 
     def create_style(
@@ -89,14 +265,18 @@ class PipelineService:
         description: str,
         visual_rules: Dict[str, Any],
         image_files: Optional[List[Path]] = None,
+        image_blobs: Optional[List[Tuple[str, bytes]]] = None,
     ) -> Style:
         """
         Create a new style and optionally build embeddings for its images.
 
+        Images come either as files to move (image_files) or as in-memory
+        (filename, content) pairs (image_blobs) written straight to the store.
+
         Returns:
             The created Style object
         """
-        self._initialize()
+        self._init_styles()
 
         style_id = slugify(name)
 
@@ -106,18 +286,20 @@ class PipelineService:
             merged_rules["additional_rules"] = {}
 
         # Create style on disk (dir, move images, write style.json)
-        create_new_style(
-            style_id=style_id,
-            name=name,
-            description=description,
-            image_files=image_files or [],
-            visual_rules=merged_rules,
-        )
+        with self._style_lock(style_id):
+            create_new_style(
+                style_id=style_id,
+                name=name,
+                description=description,
+                image_files=image_files or [],
+                visual_rules=merged_rules,
+                image_blobs=image_blobs,
+            )
+            version = self._mark_edited(style_id)
 
         # Build embeddings if images were provided
-        if image_files:
-            index = self.index_registry.get_index(style_id)
-            index.build_index()
+        if image_files or image_blobs:
+            self._rebuild_index(style_id, version)
 
         return self.style_registry.get_style(style_id)
 
@@ -130,49 +312,61 @@ class PipelineService:
         """
         self._initialize()
 
-        # Clear registry cache
-        self.style_registry.delete_style(style_id)
-
-        # Clear embedding cache
-        if style_id in self.index_registry._indices:
-            self.index_registry._indices[style_id].clear_cache()
-            del self.index_registry._indices[style_id]
-        else:
-            # Clear cache file directly even if index wasn't loaded
-            from rag.index import StyleImageIndex
-            temp_index = StyleImageIndex(
-                style_id=style_id,
-                style_registry=self.style_registry,
-                embedder=self.embedder,
-                cache_dir="rag/cache"
-            )
-            temp_index.clear_cache()
-
-        # Delete style directory and reference images from disk
-        return fs_delete_style(style_id)
+        with self._style_lock(style_id):
+            # Clear registry cache
+            self.style_registry.delete_style(style_id)
 
-    def add_images_to_style(self, style_id: str, image_files: List[Path]) -> Dict[str, int]:
+            # Clear embedding cache
+            if style_id in self.index_registry._indices:
+                self.index_registry._indices[style_id].clear_cache()
+                del self.index_registry._indices[style_id]
+            else:
+                # Clear cache file directly even if index wasn't loaded
+                from rag.index import StyleImageIndex
+                temp_index = StyleImageIndex(
+                    style_id=style_id,
+                    style_registry=self.style_registry,
+                    embedder=self.embedder,
+                    cache_dir="rag/cache"
+                )
+                temp_index.clear_cache()
+
+            # Delete style directory and reference images from disk
+            return fs_delete_style(style_id)
+
+    def add_images_to_style(
+        self,
+        style_id: str,
+        image_files: Optional[List[Path]] = None,
+        image_blobs: Optional[List[Tuple[str, bytes]]] = None,
+    ) -> Dict[str, int]:
         """
-        Add images to an existing style, rebuild embeddings.
+        Add images to an existing style and embed them.
+
+        Duplicates are dropped by content hash before anything is written, and
+        only the images new to the style are embedded.
 
         Returns:
             Dict with 'added' and 'skipped' counts
         """
-        self._initialize()
+        self._init_styles()
 
         # Add images with dedup
-        added, skipped = add_images_to_existing_style(style_id, image_files)
+        with self._style_lock(style_id):
+            added, skipped = add_images_to_existing_style(
+                style_id, image_files or [], image_blobs=image_blobs
+            )
 
-        # Clear registry cache so updated style is loaded on next access
-        self.style_registry._cache.pop(style_id, None)
+            # Clear registry cache so updated style is loaded on next access
+            self.style_registry._cache.pop(style_id, None)
+            if added > 0:
+                version = self._mark_edited(style_id)
+                # New images are appended, so they are the last `added` entries
+                added_paths = self.style_registry.get_style(style_id).reference_images[-added:]
 
-        # Rebuild embeddings for this style
+        # Embed just the new images into this style's index
         if added > 0:
-            # Clear stale index cache
-            if style_id in self.index_registry._indices:
-                del self.index_registry._indices[style_id]
-            index = self.index_registry.get_index(style_id)
-            index.build_index()
+            self._rebuild_index(style_id, version, added_paths)
 
         return {"added": added, "skipped": skipped}
 
@@ -183,22 +377,18 @@ class PipelineService:
         Returns:
             Number of images deleted from disk.
         """
-        self._initialize()
+        self._init_styles()
 
-        deleted_count = fs_delete_images_from_style(style_id, filenames)
+        with self._style_lock(style_id):
+            deleted_count = fs_delete_images_from_style(style_id, filenames)
 
-        # Clear registry cache so updated style is loaded
-        self.style_registry._cache.pop(style_id, None)
+            # Clear registry cache so updated style is loaded
+            self.style_registry._cache.pop(style_id, None)
+            version = self._mark_edited(style_id) if deleted_count > 0 else 0
 
-        # Rebuild embeddings if images were deleted
+        # Drop the deleted images' embeddings (no re-embedding of the rest)
         if deleted_count > 0:
-            if style_id in self.index_registry._indices:
-                del self.index_registry._indices[style_id]
-            # Reload style and rebuild if images remain
-            style = self.style_registry.get_style(style_id)
-            if style.reference_images:
-                index = self.index_registry.get_index(style_id)
-                index.build_index()
+            self._rebuild_index(style_id, version, removed_names=filenames)
 
         return deleted_count
 
@@ -206,15 +396,67 @@ class PipelineService:
         """
         Update style metadata (name, description, visual_rules) and return the updated Style.
         """
-        self._initialize()
+        self._init_styles()
 
-        update_style_json(style_id, updates)
+        with self._style_lock(style_id):
+            update_style_json(style_id, updates)
 
-        # Clear registry cache so next load picks up changes
-        self.style_registry._cache.pop(style_id, None)
+            # Clear registry cache so next load picks up changes
+            self.style_registry._cache.pop(style_id, None)
 
         return self.style_registry.get_style(style_id)
 
+    def _generate_context(
+        self,
+        session_id: Optional[str],
+        style_id: str
+    ) -> Tuple[Optional[ConversationContext], Optional[List[Dict[str, str]]]]:
+        """Session context and GPT conversation history for a generate turn."""
+        if not session_id:
+            return None, None
+        context = self.session_store.get_or_create(session_id, style_id)
+        if context.turn_count == 0:
+            return context, None
+        # Exclude refine turns — they are irrelevant to new concept generation
+        return context, context.to_gpt_messages(exclude_roles=["refine"])
+
+    def _refine_context(
+        self,
+        session_id: Optional[str],
+        style_id: str
+    ) -> Tuple[Optional[ConversationContext], str, List[str]]:
+        """Session context, original refined_intent and refine history for a refine turn."""
+        if not session_id:
+            return None, "", []
+        context = self.session_store.get_or_create(session_id, style_id)
+        # Last generate turn's refined_intent, and the refine prompts from
+        # the current generation cycle (after that turn)
+        return context, context.last_refined_intent, list(context.refines_since_generate)
+
+    @staticmethod
+    def _record_turn(
+        context: ConversationContext,
+        role: str,
+        timestamp: str,
+        user_input: str,
+        refined_intent: str,
+        image_paths: List[Optional[str]],
+        negative_constraints: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Append a generate/refine turn to the session and return it as a log entry."""
+        turn = ConversationTurn(
+            turn_number=context.turn_count + 1,
+            role=role,
+            timestamp=timestamp,
+            user_input=user_input,
+            style_id=context.style_id,
+            refined_intent=refined_intent,
+            negative_constraints=negative_constraints,
+            image_paths=image_paths
+        )
+        context.add_turn(turn)
+        return turn.to_dict()
+
     def generate(
         self,
         user_input: str,
@@ -236,58 +478,70 @@ class PipelineService:
         """
         self._initialize()
 
-        # Step 1: Get style
+        # Step 1: Get style and conversation history if session exists
         style = self.style_registry.get_style(style_id)
+        context, conversation_history = self._generate_context(session_id, style_id)
 
-        # Step 2: Get conversation history if session exists
-        # Exclude refine turns — they are irrelevant to new concept generation
-        conversation_history = None
-        context = None
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            if context.turn_count > 0:
-                conversation_history = context.to_gpt_messages(exclude_roles=["refine"])
-
-        # Step 3: Compile prompt with GPT (with conversation context)
+        # Step 2: Compile prompt with GPT (with conversation context). The
+        # retrieval query needs refined_intent, but the style's embeddings can
+        # load on the RAG pool meanwhile (as in _compile_async)
+        preload = self._rag_pool.submit(self._preload_embeddings, style_id)
         prompt_spec = self.compiler.compile(
             user_input, style,
             conversation_history=conversation_history
         )
+        preload.result()
 
-        # Step 4: Retrieve reference images
+        # Step 3: Retrieve reference images
         retrieval_result = self.retriever.retrieve(prompt_spec, style, top_k=3)
 
-        # Step 5: Generate images
-        config = GenerationConfig(
-            num_images=num_images,
-            resolution=(1024, 1024),
-            output_dir="generated_outputs"
-        )
-
+        # Step 4: Generate images
         result = self.generator.generate(
             prompt_spec=prompt_spec,
             retrieval_result=retrieval_result,
             style=style,
-            config=config
+            config=self._generation_config(num_images)
         )
 
-        # Step 6: Record generation turn in session
-        if session_id and context is not None:
-            turn = ConversationTurn(
-                turn_number=context.turn_count + 1,
-                role="generate",
-                timestamp=result.timestamp,
-                user_input=user_input,
-                style_id=style_id,
-                refined_intent=prompt_spec.refined_intent,
-                negative_constraints=prompt_spec.negative_constraints,
-                image_paths=result.images
+        # Step 5: Record generation turn in session
+        if context is not None:
+            turn = self._record_turn(
+                context, "generate", result.timestamp, user_input,
+                prompt_spec.refined_intent, result.images,
+                prompt_spec.negative_constraints
             )
-            context.add_turn(turn)
-            self.conversation_logger.log_turn(session_id, style_id, turn.to_dict())
+            self.conversation_logger.log_turn(session_id, style_id, turn)
 
         return result, prompt_spec, retrieval_result, style
 
+    async def _compile_async(
+        self,
+        user_input: str,
+        style: Style,
+        conversation_history: Optional[List[Dict[str, str]]]
+    ) -> PromptSpec:
+        """
+        Compile the prompt on the GPT worker pool.
+
+        The retrieval query needs refined_intent, but the style's embeddings
+        can load from disk while GPT compiles.
+        """
+        loop = asyncio.get_running_loop()
+        prompt_spec, _ = await asyncio.gather(
+            loop.run_in_executor(
+                self._gpt_pool, self.compiler.compile,
+                user_input, style, conversation_history
+            ),
+            loop.run_in_executor(self._rag_pool, self._preload_embeddings, style.id),
+        )
+        return prompt_spec
+
+    async def _retrieve_async(self, prompt_spec: PromptSpec, style: Style) -> RetrievalResult:
+        """Retrieve reference images on the RAG worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._rag_pool, self.retriever.retrieve, prompt_spec, style, 3
+        )
+
     async def generate_async(
         self,
         user_input: str,
@@ -299,53 +553,28 @@ class PipelineService:
         self._initialize()
 
         style = self.style_registry.get_style(style_id)
+        context, conversation_history = self._generate_context(session_id, style_id)
 
-        conversation_history = None
-        context = None
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            if context.turn_count > 0:
-                conversation_history = context.to_gpt_messages(exclude_roles=["refine"])
-
-        # Prompt compilation (sync — runs in thread to avoid blocking event loop)
-        prompt_spec = await asyncio.to_thread(
-            self.compiler.compile,
-            user_input, style,
-            conversation_history
-        )
-
-        # RAG retrieval (sync — runs in thread)
-        retrieval_result = await asyncio.to_thread(
-            self.retriever.retrieve, prompt_spec, style, 3
-        )
+        # Prompt compilation and RAG retrieval are sync — run in threads
+        prompt_spec = await self._compile_async(user_input, style, conversation_history)
+        retrieval_result = await self._retrieve_async(prompt_spec, style)
 
         # Image generation (async)
-        config = GenerationConfig(
-            num_images=num_images,
-            resolution=(1024, 1024),
-            output_dir="generated_outputs"
-        )
         result = await self.generator.generate_async(
             prompt_spec=prompt_spec,
             retrieval_result=retrieval_result,
             style=style,
-            config=config
+            config=self._generation_config(num_images)
         )
 
         # Record turn
-        if session_id and context is not None:
-            turn = ConversationTurn(
-                turn_number=context.turn_count + 1,
-                role="generate",
-                timestamp=result.timestamp,
-                user_input=user_input,
-                style_id=style_id,
-                refined_intent=prompt_spec.refined_intent,
-                negative_constraints=prompt_spec.negative_constraints,
-                image_paths=result.images
+        if context is not None:
+            turn = self._record_turn(
+                context, "generate", result.timestamp, user_input,
+                prompt_spec.refined_intent, result.images,
+                prompt_spec.negative_constraints
             )
-            context.add_turn(turn)
-            self.conversation_logger.log_turn(session_id, style_id, turn.to_dict())
+            self.conversation_logger.log_turn(session_id, style_id, turn)
 
         return result, prompt_spec, retrieval_result, style
 
@@ -369,20 +598,10 @@ class PipelineService:
         self._initialize()
 
         style = self.style_registry.get_style(style_id)
+        context, conversation_history = self._generate_context(session_id, style_id)
 
-        conversation_history = None
-        context = None
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            if context.turn_count > 0:
-                conversation_history = context.to_gpt_messages(exclude_roles=["refine"])
-
-        # Step 1: Compile prompt
-        prompt_spec = await asyncio.to_thread(
-            self.compiler.compile,
-            user_input, style,
-            conversation_history
-        )
+        # Step 1: Compile prompt, loading the style's embeddings alongside it
+        prompt_spec = await self._compile_async(user_input, style, conversation_history)
         yield {
             "event": "progress",
             "data": {
@@ -392,9 +611,7 @@ class PipelineService:
         }
 
         # Step 2: RAG retrieval
-        retrieval_result = await asyncio.to_thread(
-            self.retriever.retrieve, prompt_spec, style, 3
-        )
+        retrieval_result = await self._retrieve_async(prompt_spec, style)
         yield {
             "event": "progress",
             "data": {
@@ -404,82 +621,39 @@ class PipelineService:
         }
 
         # Step 3: Stream images as they complete
-        config = GenerationConfig(
-            num_images=num_images,
-            resolution=(1024, 1024),
-            output_dir="generated_outputs"
-        )
-
-        from generate.types import GenerationPayload
-        payload = GenerationPayload(
-            prompt_spec=prompt_spec,
-            retrieval_result=retrieval_result,
-            config=config,
-            style=style
-        )
-
+        config = self._generation_config(num_images)
         image_paths: List[Optional[str]] = [None] * num_images
         image_errors: List[Optional[str]] = [None] * num_images
-        completed_count = 0
-
-        # Collect retry notifications and emit as SSE progress events
-        retry_events = []
-
-        def on_retry(index, attempt, max_retries):
-            retry_events.append({"index": index, "attempt": attempt, "maxRetries": max_retries})
 
-        async for idx, image_path, error in self.generator.generate_streaming_async(
-            prompt_spec=prompt_spec,
-            retrieval_result=retrieval_result,
-            style=style,
-            config=config,
-            on_retry=on_retry
+        # Same for every image in the stream. The metadata is encoded to JSON
+        # once here; the SSE route's orjson splices the Fragment in verbatim
+        sketch_metadata = orjson.Fragment(orjson.dumps({
+            "promptSpec": {
+                "intent": prompt_spec.intent,
+                "refinedIntent": prompt_spec.refined_intent,
+                "negativeConstraints": prompt_spec.negative_constraints or []
+            },
+            "referenceImages": [img.path for img in retrieval_result.images],
+            "retrievalScores": retrieval_result.scores
+        }))
+
+        async for event in _image_events(
+            lambda on_retry: self.generator.generate_streaming_async(
+                prompt_spec=prompt_spec,
+                retrieval_result=retrieval_result,
+                style=style,
+                config=config,
+                on_retry=on_retry
+            ),
+            "stream", config, sketch_metadata, image_paths, image_errors
         ):
-            # Drain any retry events accumulated since last image completed
-            for info in retry_events:
-                yield {
-                    "event": "progress",
-                    "data": {"stage": "retry", **info}
-                }
-            retry_events.clear()
-
-            image_paths[idx] = image_path
-            image_errors[idx] = error
-            completed_count += 1
-
-            if image_path is not None:
-                rel_path = Path(image_path).relative_to(Path("generated_outputs").resolve())
-                sketch_data = {
-                    "id": f"stream_{idx}",
-                    "resolution": list(config.resolution),
-                    "imagePath": f"/generated/{rel_path}",
-                    "metadata": {
-                        "promptSpec": {
-                            "intent": prompt_spec.intent,
-                            "refinedIntent": prompt_spec.refined_intent,
-                            "negativeConstraints": prompt_spec.negative_constraints or []
-                        },
-                        "referenceImages": [img.path for img in retrieval_result.images],
-                        "retrievalScores": retrieval_result.scores
-                    }
-                }
-                yield {
-                    "event": "image",
-                    "data": {"index": idx, "sketch": sketch_data}
-                }
-            else:
-                yield {
-                    "event": "image",
-                    "data": {"index": idx, "sketch": None, "error": error}
-                }
+            yield event
 
         # Step 4: Save metadata for all images
-        from generate.utils import save_metadata, get_timestamp
         timestamp = get_timestamp()
         successful_paths = [p for p in image_paths if p is not None]
         if successful_paths:
-            output_dir = os.path.dirname(successful_paths[0])
-            metadata_dict = {
+            await _save_stream_metadata({
                 "timestamp": timestamp,
                 "archived": False,
                 "user_prompt": prompt_spec.intent,
@@ -496,35 +670,18 @@ class PipelineService:
                     "aspect_ratio": config.aspect_ratio,
                     "image_size": config.image_size
                 },
-                "images": [os.path.basename(p) for p in successful_paths],
-                "image_errors": [e for e in image_errors if e is not None]
-            }
-            save_metadata(metadata_dict, output_dir)
+            }, successful_paths, image_errors)
 
         # Step 5: Record turn
-        if session_id and context is not None:
-            turn = ConversationTurn(
-                turn_number=context.turn_count + 1,
-                role="generate",
-                timestamp=timestamp,
-                user_input=user_input,
-                style_id=style_id,
-                refined_intent=prompt_spec.refined_intent,
-                negative_constraints=prompt_spec.negative_constraints,
-                image_paths=image_paths
+        if context is not None:
+            turn = self._record_turn(
+                context, "generate", timestamp, user_input,
+                prompt_spec.refined_intent, image_paths,
+                prompt_spec.negative_constraints
             )
-            context.add_turn(turn)
-            self.conversation_logger.log_turn(session_id, style_id, turn.to_dict())
+            self.conversation_logger.log_turn(session_id, style_id, turn)
 
-        yield {
-            "event": "complete",
-            "data": {
-                "timestamp": timestamp,
-                "totalImages": num_images,
-                "successCount": len(successful_paths),
-                "styleId": style.id
-            }
-        }
+        yield _complete_event(timestamp, num_images, successful_paths, style)
 
     def refine(
         self,
@@ -551,58 +708,59 @@ class PipelineService:
         """
         self._initialize()
 
-        # Step 1: Get style
+        # Step 1: Get style and the original context from the generation cycle
         style = self.style_registry.get_style(style_id)
+        context, original_context, refine_history = self._refine_context(session_id, style_id)
 
-        # Step 2: Get original context from the initial generation turn
-        original_context = ""
-        refine_history = []
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            # Find the last role="generate" turn's refined_intent
-            for turn in reversed(context.turns):
-                if turn.role == "generate" and turn.refined_intent:
-                    original_context = turn.refined_intent
-                    break
-            # Collect refine prompts only from the current generation cycle
-            # (i.e., after the last "generate" turn)
-            refine_history = []
-            for turn in reversed(context.turns):
-                if turn.role == "refine":
-                    refine_history.insert(0, turn.user_input)
-                elif turn.role == "generate":
-                    break
-
-        # Step 3: Refine images (1:1 mapping — each source → 1 output)
-        config = GenerationConfig(
-            num_images=len(selected_image_paths),
-            resolution=(1024, 1024),
-            output_dir="generated_outputs"
+        # Step 2: Refine images (1:1 mapping — each source → 1 output)
+        result = self.generator.refine(
+            refine_prompt=refine_prompt,
+            original_context=original_context,
+            refine_history=refine_history,
+            source_image_paths=selected_image_paths,
+            style=style,
+            config=self._generation_config(len(selected_image_paths)),
         )
 
-        result = self.generator.refine(
+        # Step 3: Record refine turn in session
+        if context is not None:
+            turn = self._record_turn(
+                context, "refine", result.timestamp, refine_prompt,
+                original_context, result.images
+            )
+            self.conversation_logger.log_turn(session_id, style_id, turn)
+
+        return result, style
+
+    async def refine_async(
+        self,
+        refine_prompt: str,
+        selected_image_paths: List[str],
+        style_id: str,
+        session_id: Optional[str] = None,
+    ) -> Tuple[GenerationResult, Style]:
+        """Async version of refine(). Uses async Gemini calls for image editing."""
+        self._initialize()
+
+        style = self.style_registry.get_style(style_id)
+        context, original_context, refine_history = self._refine_context(session_id, style_id)
+
+        result = await self.generator.refine_async(
             refine_prompt=refine_prompt,
             original_context=original_context,
             refine_history=refine_history,
             source_image_paths=selected_image_paths,
             style=style,
-            config=config,
+            config=self._generation_config(len(selected_image_paths)),
         )
 
-        # Step 4: Record refine turn in session
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            turn = ConversationTurn(
-                turn_number=context.turn_count + 1,
-                role="refine",
-                timestamp=result.timestamp,
-                user_input=refine_prompt,
-                style_id=style_id,
-                refined_intent=original_context,
-                image_paths=result.images,
+        # Record turn
+        if context is not None:
+            turn = self._record_turn(
+                context, "refine", result.timestamp, refine_prompt,
+                original_context, result.images
             )
-            context.add_turn(turn)
-            self.conversation_logger.log_turn(session_id, style_id, turn.to_dict())
+            self.conversation_logger.log_turn(session_id, style_id, turn)
 
         return result, style
 
@@ -619,90 +777,43 @@ class PipelineService:
         self._initialize()
 
         style = self.style_registry.get_style(style_id)
-
-        original_context = ""
-        refine_history = []
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            for turn in reversed(context.turns):
-                if turn.role == "generate" and turn.refined_intent:
-                    original_context = turn.refined_intent
-                    break
-            refine_history = []
-            for turn in reversed(context.turns):
-                if turn.role == "refine":
-                    refine_history.insert(0, turn.user_input)
-                elif turn.role == "generate":
-                    break
-
-        config = GenerationConfig(
-            num_images=len(selected_image_paths),
-            resolution=(1024, 1024),
-            output_dir="generated_outputs"
-        )
+        context, original_context, refine_history = self._refine_context(session_id, style_id)
 
         num_images = len(selected_image_paths)
+        config = self._generation_config(num_images)
         image_paths: List[Optional[str]] = [None] * num_images
         image_errors: List[Optional[str]] = [None] * num_images
 
-        retry_events = []
-
-        def on_retry(index, attempt, max_retries):
-            retry_events.append({"index": index, "attempt": attempt, "maxRetries": max_retries})
-
-        async for idx, image_path, error in self.generator.refine_streaming_async(
-            refine_prompt=refine_prompt,
-            original_context=original_context,
-            refine_history=refine_history,
-            source_image_paths=selected_image_paths,
-            style=style,
-            config=config,
-            on_retry=on_retry
+        # Same for every image in the stream, pre-encoded (see generate_streaming)
+        sketch_metadata = orjson.Fragment(orjson.dumps({
+            "promptSpec": {
+                "intent": refine_prompt,
+                "refinedIntent": original_context,
+                "negativeConstraints": []
+            },
+            "referenceImages": selected_image_paths,
+            "retrievalScores": []
+        }))
+
+        async for event in _image_events(
+            lambda on_retry: self.generator.refine_streaming_async(
+                refine_prompt=refine_prompt,
+                original_context=original_context,
+                refine_history=refine_history,
+                source_image_paths=selected_image_paths,
+                style=style,
+                config=config,
+                on_retry=on_retry
+            ),
+            "refine", config, sketch_metadata, image_paths, image_errors
         ):
-            # Drain retry events
-            for info in retry_events:
-                yield {
-                    "event": "progress",
-                    "data": {"stage": "retry", **info}
-                }
-            retry_events.clear()
-
-            image_paths[idx] = image_path
-            image_errors[idx] = error
-
-            if image_path is not None:
-                rel_path = Path(image_path).relative_to(Path("generated_outputs").resolve())
-                sketch_data = {
-                    "id": f"refine_{idx}",
-                    "resolution": list(config.resolution),
-                    "imagePath": f"/generated/{rel_path}",
-                    "metadata": {
-                        "promptSpec": {
-                            "intent": refine_prompt,
-                            "refinedIntent": original_context,
-                            "negativeConstraints": []
-                        },
-                        "referenceImages": selected_image_paths,
-                        "retrievalScores": []
-                    }
-                }
-                yield {
-                    "event": "image",
-                    "data": {"index": idx, "sketch": sketch_data}
-                }
-            else:
-                yield {
-                    "event": "image",
-                    "data": {"index": idx, "sketch": None, "error": error}
-                }
+            yield event
 
         # Save metadata
-        from generate.utils import save_metadata, get_timestamp
         timestamp = get_timestamp()
         successful_paths = [p for p in image_paths if p is not None]
         if successful_paths:
-            output_dir = os.path.dirname(successful_paths[0])
-            metadata_dict = {
+            await _save_stream_metadata({
                 "timestamp": timestamp,
                 "archived": False,
                 "mode": "refine",
@@ -717,35 +828,17 @@ class PipelineService:
                     "model_name": config.model_name,
                     "aspect_ratio": config.aspect_ratio,
                 },
-                "images": [os.path.basename(p) for p in successful_paths],
-                "image_errors": [e for e in image_errors if e is not None],
-            }
-            save_metadata(metadata_dict, output_dir)
+            }, successful_paths, image_errors)
 
         # Record turn
-        if session_id:
-            context = self.session_store.get_or_create(session_id, style_id)
-            turn = ConversationTurn(
-                turn_number=context.turn_count + 1,
-                role="refine",
-                timestamp=timestamp,
-                user_input=refine_prompt,
-                style_id=style_id,
-                refined_intent=original_context,
-                image_paths=image_paths,
+        if context is not None:
+            turn = self._record_turn(
+                context, "refine", timestamp, refine_prompt,
+                original_context, image_paths
             )
-            context.add_turn(turn)
-            self.conversation_logger.log_turn(session_id, style_id, turn.to_dict())
+            self.conversation_logger.log_turn(session_id, style_id, turn)
 
-        yield {
-            "event": "complete",
-            "data": {
-                "timestamp": timestamp,
-                "totalImages": num_images,
-                "successCount": len(successful_paths),
-                "styleId": style.id
-            }
-        }
+        yield _complete_event(timestamp, num_images, successful_paths, style)
 
     def add_feedback(
         self,
@@ -765,7 +858,7 @@ class PipelineService:
         turn = ConversationTurn(
             turn_number=context.turn_count + 1,
             role="feedback",
-            timestamp=datetime.utcnow().isoformat(),
+            timestamp=datetime.now(timezone.utc).isoformat(),
             user_input=feedback,
             style_id=style_id,
         )
@@ -841,3 +934,153 @@ class PipelineService:
         self.session_store.reset(session_id, style_id)
 
         return summary
+
+
+def _load_embedder():
+    # Heavy dependencies, imported on first use rather than with the module
+    from rag.embedder import ImageEmbedder
+    return ImageEmbedder()
+
+
+def _load_generator():
+    from generate.generator import ImageGenerator
+    return ImageGenerator()
+
+
+def _generated_url(image_path: str) -> str:
+    """Map a saved sketch path (<output_dir>/<timestamp>/sketch_N.png) to its /generated URL."""
+    run_dir, filename = os.path.split(image_path)
+    return f"/generated/{os.path.basename(run_dir)}/{filename}"
+
+
+async def _with_retry_events(
+    make_stream: Callable[[Callable[[int, int, int], None]], AsyncIterator[Any]]
+) -> AsyncGenerator[Tuple[str, Any], None]:
+    """
+    Run make_stream(on_retry) and interleave its items with retry notices.
+
+    Yields ("retry", info) as soon as a retry is reported and ("item", item)
+    for each streamed result, so a retry isn't held back until the next
+    image finishes (or dropped when it happens after the last one).
+    """
+    retries: asyncio.Queue = asyncio.Queue()
+
+    def on_retry(index, attempt, max_retries):
+        # The async Gemini client reports retries from the event loop itself
+        retries.put_nowait({"index": index, "attempt": attempt, "maxRetries": max_retries})
+
+    stream = make_stream(on_retry).__aiter__()
+    next_item = asyncio.ensure_future(stream.__anext__())
+    next_retry = asyncio.ensure_future(retries.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {next_item, next_retry}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_retry in done:
+                yield "retry", next_retry.result()
+                next_retry = asyncio.ensure_future(retries.get())
+                continue
+
+            try:
+                item = next_item.result()
+            except StopAsyncIteration:
+                break
+            yield "item", item
+            next_item = asyncio.ensure_future(stream.__anext__())
+
+        while not retries.empty():
+            yield "retry", retries.get_nowait()
+    finally:
+        next_retry.cancel()
+        if not next_item.done():
+            next_item.cancel()
+            await asyncio.gather(next_item, return_exceptions=True)
+        await stream.aclose()
+
+
+async def _image_events(
+    make_stream: Callable[[Callable[[int, int, int], None]], AsyncIterator[Any]],
+    id_prefix: str,
+    config: GenerationConfig,
+    sketch_metadata: Any,
+    image_paths: List[Optional[str]],
+    image_errors: List[Optional[str]]
+) -> AsyncGenerator[dict, None]:
+    """
+    Relay a generator image stream as SSE "image"/"progress" event dicts.
+
+    Fills image_paths and image_errors by index as results arrive, so the
+    caller can write metadata and record the turn once the stream ends.
+    """
+    resolution = list(config.resolution)
+    async for kind, item in _with_retry_events(make_stream):
+        if kind == "retry":
+            # Retry notifications go out as progress events the moment they happen
+            yield {
+                "event": "progress",
+                "data": {"stage": "retry", **item}
+            }
+            continue
+
+        idx, image_path, error = item
+        image_paths[idx] = image_path
+        image_errors[idx] = error
+
+        if image_path is not None:
+            sketch_data = {
+                "id": f"{id_prefix}_{idx}",
+                "resolution": resolution,
+                "imagePath": _generated_url(image_path),
+                "metadata": sketch_metadata
+            }
+            yield {
+                "event": "image",
+                "data": {"index": idx, "sketch": sketch_data}
+            }
+        else:
+            yield {
+                "event": "image",
+                "data": {"index": idx, "sketch": None, "error": error}
+            }
+
+
+async def _save_stream_metadata(
+    metadata_dict: Dict[str, Any],
+    successful_paths: List[str],
+    image_errors: List[Optional[str]]
+) -> None:
+    """Write metadata.json next to a stream's images, adding the per-image fields."""
+    metadata_dict["images"] = [os.path.basename(p) for p in successful_paths]
+    metadata_dict["image_errors"] = [e for e in image_errors if e is not None]
+    # Awaited, not fire-and-forget: the client confirms the generation
+    # (which reads metadata.json) as soon as it sees "complete"
+    await asyncio.to_thread(save_metadata, metadata_dict, os.path.dirname(successful_paths[0]))
+
+
+def _complete_event(
+    timestamp: str,
+    num_images: int,
+    successful_paths: List[str],
+    style: Style
+) -> dict:
+    return {
+        "event": "complete",
+        "data": {
+            "timestamp": timestamp,
+            "totalImages": num_images,
+            "successCount": len(successful_paths),
+            "styleId": style.id
+        }
+    }
+
+
+_pipeline: Optional[PipelineService] = None
+
+
+def get_pipeline() -> PipelineService:
+    """Return the shared PipelineService, creating it on first use."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = PipelineService()
+    return _pipeline
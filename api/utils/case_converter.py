@@ -1,33 +1,81 @@
 """Utilities for converting between snake_case and camelCase."""
 
 import re
-from typing import Any, Dict, List, Union
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Union
 
+_CAMEL_BOUNDARY_RE = re.compile(r'(?<!^)(?=[A-Z])')
 
+
+# Payload keys come from a small fixed vocabulary, so conversions are memoized
+@lru_cache(maxsize=2048)
 def snake_to_camel(snake_str: str) -> str:
     """Convert snake_case string to camelCase."""
     components = snake_str.split('_')
     return components[0] + ''.join(x.title() for x in components[1:])
 
 
+@lru_cache(maxsize=2048)
 def camel_to_snake(camel_str: str) -> str:
     """Convert camelCase string to snake_case."""
-    return re.sub(r'(?<!^)(?=[A-Z])', '_', camel_str).lower()
+    return _CAMEL_BOUNDARY_RE.sub('_', camel_str).lower()
 
 
-def convert_keys_to_camel(data: Union[Dict, List, Any]) -> Union[Dict, List, Any]:
-    """Recursively convert all dictionary keys from snake_case to camelCase."""
+# Leaf types that dominate payloads, ruled out with one set lookup per value
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+
+def _convert_keys(data: Union[Dict, List, Any], convert_key: Callable[[str], str]) -> Union[Dict, List, Any]:
+    """
+    Copy nested dicts/lists with every dict key passed through convert_key.
+
+    Walks the tree with an explicit stack of (source, output) containers
+    rather than recursing: scalars are copied across as-is, and nested
+    containers are created empty and queued to be filled.
+    """
     if isinstance(data, dict):
-        return {snake_to_camel(k): convert_keys_to_camel(v) for k, v in data.items()}
+        root: Union[Dict, List] = {}
     elif isinstance(data, list):
-        return [convert_keys_to_camel(item) for item in data]
-    return data
+        root = []
+    else:
+        return data
+
+    scalar_types = _SCALAR_TYPES
+    stack = [(data, root)]
+    push = stack.append
+    while stack:
+        source, target = stack.pop()
+        if type(target) is dict:
+            for key, value in source.items():
+                if type(value) not in scalar_types:
+                    if isinstance(value, dict):
+                        child = {}
+                        push((value, child))
+                        value = child
+                    elif isinstance(value, list):
+                        child = []
+                        push((value, child))
+                        value = child
+                target[convert_key(key)] = value
+        else:
+            # Copy the list whole, then swap in output containers for nested ones
+            target.extend(source)
+            for i, value in enumerate(source):
+                if type(value) not in scalar_types:
+                    if isinstance(value, dict):
+                        target[i] = child = {}
+                        push((value, child))
+                    elif isinstance(value, list):
+                        target[i] = child = []
+                        push((value, child))
+    return root
+
+
+def convert_keys_to_camel(data: Union[Dict, List, Any]) -> Union[Dict, List, Any]:
+    """Recursively convert all dictionary keys from snake_case to camelCase."""
+    return _convert_keys(data, snake_to_camel)
 
 
 def convert_keys_to_snake(data: Union[Dict, List, Any]) -> Union[Dict, List, Any]:
     """Recursively convert all dictionary keys from camelCase to snake_case."""
-    if isinstance(data, dict):
-        return {camel_to_snake(k): convert_keys_to_snake(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [convert_keys_to_snake(item) for item in data]
-    return data
+    return _convert_keys(data, camel_to_snake)
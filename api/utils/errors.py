@@ -0,0 +1,11 @@
+"""Client-safe error messages for failures raised by the generation pipeline."""
+
+_BUSY_MARKERS = ("429", "rate", "quota", "busy")
+
+
+def friendly_error_message(exc: Exception, action: str) -> str:
+    """Map an upstream failure to the message shown in the UI, e.g. action="generation"."""
+    error_str = str(exc).lower()
+    if any(marker in error_str for marker in _BUSY_MARKERS):
+        return "The server is busy. Please wait a moment and try again."
+    return f"Something went wrong during {action}. Please try again."
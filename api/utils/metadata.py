@@ -0,0 +1,40 @@
+"""Helpers for reading generation metadata.json files."""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+# Shared pool for fanning out metadata reads so slow disks can pipeline the I/O
+_READ_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="metadata-read")
+
+
+def read_metadata(generation_dir: Path) -> Optional[Dict[str, Any]]:
+    """Load a generation's metadata.json, or None if it is missing or unreadable."""
+    try:
+        with open(generation_dir / "metadata.json", "rb") as f:
+            return orjson.loads(f.read())
+    except (orjson.JSONDecodeError, IOError):
+        return None
+
+
+def read_metadata_many(generation_dirs: List[Path]) -> List[Optional[Dict[str, Any]]]:
+    """Read metadata for several generation dirs in parallel, preserving order."""
+    return list(_READ_POOL.map(read_metadata, generation_dirs))
+
+
+def read_all_metadata(base_dir: Path) -> List[Tuple[Path, Dict[str, Any]]]:
+    """
+    Read metadata for every generation dir under base_dir in parallel.
+
+    Returns:
+        List of (generation_dir, metadata) pairs, newest-first. Dirs without
+        readable metadata are skipped.
+    """
+    if not base_dir.exists():
+        return []
+
+    entries = [entry for entry in sorted(base_dir.iterdir(), reverse=True) if entry.is_dir()]
+    metas = read_metadata_many(entries)
+    return [(entry, meta) for entry, meta in zip(entries, metas) if meta is not None]
@@ -0,0 +1,33 @@
+"""ASGI middleware used by the API app."""
+
+from typing import Tuple
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """
+    GZip for JSON API responses only.
+
+    Static mounts serve already-compressed PNG/JPEG and SSE routes must flush each
+    event as it is produced, so both bypass compression entirely.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compresslevel: int = 6,
+        passthrough_prefixes: Tuple[str, ...] = ("/generated/", "/reference-images/"),
+    ) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.passthrough_prefixes = passthrough_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path.startswith(self.passthrough_prefixes) or path.endswith("-stream"):
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
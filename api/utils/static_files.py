@@ -0,0 +1,113 @@
+"""Static file serving for generated sketches and reference images."""
+
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Hot-asset cache budget (shared by all mounts) and largest single file kept in it
+STATIC_CACHE_BYTES = int(os.getenv("STATIC_CACHE_MB", "128")) * 1024 * 1024
+STATIC_CACHE_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+
+class AssetCache:
+    """Byte-bounded LRU of file contents keyed by (path, mtime_ns, size)."""
+
+    def __init__(self, max_bytes: int = STATIC_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int, int], bytes]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Tuple[str, int, int]) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: Tuple[str, int, int], body: bytes) -> None:
+        if len(body) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = body
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+
+_asset_cache = AssetCache()
+
+
+def _read_bytes(path: os.PathLike) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ChunkedFileResponse(FileResponse):
+    """FileResponse that streams large files in 1 MB blocks to cut event-loop round-trips."""
+
+    chunk_size = 1024 * 1024
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles mount that serves files via ChunkedFileResponse.
+
+    Small files are also kept in an in-memory LRU so repeat fetches of the same
+    sketch or reference image skip the disk read entirely. Entries are keyed on
+    mtime and size, so a rewritten file is never served stale.
+    """
+
+    def __init__(
+        self,
+        *args,
+        cache: Optional[AssetCache] = None,
+        cache_control: str = DEFAULT_CACHE_CONTROL,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.cache = cache if cache is not None else _asset_cache
+        self.cache_control = cache_control
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if (
+            not isinstance(response, ChunkedFileResponse)
+            or response.status_code != 200
+            or scope["method"] != "GET"
+            or "range" in Headers(scope=scope)
+        ):
+            return response
+
+        stat_result = response.stat_result
+        if stat_result.st_size > STATIC_CACHE_MAX_ENTRY_BYTES:
+            return response
+
+        key = (str(response.path), stat_result.st_mtime_ns, stat_result.st_size)
+        body = self.cache.get(key)
+        if body is None:
+            body = await anyio.to_thread.run_sync(_read_bytes, response.path)
+            if len(body) != stat_result.st_size:
+                # File changed between stat and read; stream it instead of caching
+                return response
+            self.cache.put(key, body)
+        return Response(body, headers=response.headers)
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        response = ChunkedFileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers.setdefault("cache-control", self.cache_control)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,29 +1,158 @@
 """JSONL logger for conversation feedback turns."""
 
-import json
-from datetime import datetime
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+import orjson
+
+# Turns buffered for the writer thread before log_turn starts dropping them
+LOG_QUEUE_SIZE = 10000
+# Most turns the writer thread pulls off the queue per write
+LOG_BATCH_SIZE = 256
+# A day's log rolls over to <date>.1.jsonl, <date>.2.jsonl, ... past this size
+LOG_MAX_BYTES = int(os.getenv("CONVERSATION_LOG_MAX_MB", "64")) * 1024 * 1024
 
 
 class ConversationLogger:
-    """Appends conversation turns to a JSONL log file for designer review."""
+    """
+    Appends conversation turns to a JSONL log file for designer review.
+
+    Files are partitioned by UTC date, and a day's file rolls over to a new
+    numbered part once it passes LOG_MAX_BYTES.
+
+    log_turn() only enqueues the entry; a daemon thread drains the queue,
+    keeping the current file open as a raw O_APPEND descriptor and handing
+    each batch of turns to the kernel in a single write.
+    Pending turns are flushed by close(), which also runs at interpreter exit.
+    """
 
     def __init__(self, log_dir: str = "feedback/logs/conversations"):
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(parents=True, exist_ok=True)
 
+        # (UTC date, encoded JSON line) pairs; None tells the writer to stop
+        self._queue: "queue.Queue[Optional[Tuple[str, bytes]]]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._closed = False
+        # (UTC day number, that day's date string), swapped as one tuple
+        self._log_day: Tuple[int, str] = (-1, "")
+        self._writer = threading.Thread(target=self._drain, name="conversation-logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
     def log_turn(self, session_id: str, style_id: str, turn_data: Dict[str, Any]) -> None:
-        """Append one JSONL line per turn, partitioned by date."""
-        today = datetime.utcnow().strftime("%Y-%m-%d")
-        log_file = self.log_dir / f"{today}.jsonl"
+        """Queue one JSONL line per turn, partitioned by date."""
+        now = time.time()
+
+        # The date only changes at UTC midnight (POSIX time has exactly
+        # 86400 s per day), so format it once per day, not per turn
+        day = int(now) // 86400
+        cached_day, date = self._log_day
+        if day != cached_day:
+            date = time.strftime("%Y-%m-%d", time.gmtime(now))
+            self._log_day = (day, date)
 
         entry = {
             "session_id": session_id,
             "style_id": style_id,
-            "logged_at": datetime.utcnow().isoformat(),
+            "logged_at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
             **turn_data
         }
+        line = orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE)
+
+        try:
+            self._queue.put_nowait((date, line))
+        except queue.Full:
+            print(f"[Logger] Log queue full, dropped turn for session {session_id}")
+
+    def close(self) -> None:
+        """Write out every queued turn and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def _drain(self) -> None:
+        buf = bytearray()  # Reused to assemble every batch
+        date: Optional[str] = None
+        part = 0
+        fd: Optional[int] = None
+        size = 0
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+
+            # A batch can straddle midnight, so write it per day
+            for batch_date, entries in groupby(batch, key=itemgetter(0)):
+                buf.clear()
+                count = 0
+                for _, line in entries:
+                    buf += line
+                    count += 1
+
+                try:
+                    if batch_date != date:
+                        # Resume the day's newest part (e.g. after a restart)
+                        if fd is not None:
+                            os.close(fd)
+                        fd, date = None, None
+                        part = self._last_part(batch_date)
+                        fd, size = self._open_part(batch_date, part)
+                        date = batch_date
+                    if 0 < size and 0 < LOG_MAX_BYTES < size + len(buf):
+                        os.close(fd)
+                        fd, date = None, None
+                        part += 1
+                        fd, size = self._open_part(batch_date, part)
+                        date = batch_date
+                    _write_all(fd, buf)
+                    size += len(buf)
+                except OSError as e:
+                    print(f"[Logger] Failed to log {count} turn(s): {e}")
+
+            if stop:
+                if fd is not None:
+                    os.close(fd)
+                return
+
+    def _open_part(self, date: str, part: int) -> Tuple[int, int]:
+        """Open one numbered part of a day's log for appending; returns (fd, current size)."""
+        name = f"{date}.jsonl" if part == 0 else f"{date}.{part}.jsonl"
+        fd = os.open(self.log_dir / name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return fd, os.fstat(fd).st_size
+
+    def _last_part(self, date: str) -> int:
+        """Highest existing part number for a date (0 if none), so a restart keeps appending to it."""
+        parts = [0]
+        for path in self.log_dir.glob(f"{date}.*.jsonl"):
+            suffix = path.name[len(date) + 1:-len(".jsonl")]
+            if suffix.isdigit():
+                parts.append(int(suffix))
+        return max(parts)
+
+    def _next_batch(self) -> List[Optional[Tuple[str, bytes]]]:
+        """Block for one queued turn, then take whatever else is ready (up to LOG_BATCH_SIZE)."""
+        batch = [self._queue.get()]
+        while len(batch) < LOG_BATCH_SIZE and batch[-1] is not None:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
 
-        with open(log_file, "a") as f:
-            f.write(json.dumps(entry) + "\n")
+def _write_all(fd: int, data: bytes) -> None:
+    """os.write until every byte is out (a regular-file write can return short)."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
@@ -1,8 +1,12 @@
 """Session management for conversational feedback."""
 
+import threading
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# Locks guarding SessionStore session creation
+SESSION_LOCK_STRIPES = 16
 
 
 @dataclass
@@ -40,77 +44,138 @@ class ConversationContext:
     session_id: str
     style_id: str
     turns: List[ConversationTurn] = field(default_factory=list)
-    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+    # Kept current by add_turn() so refines don't rescan the history:
+    # refined_intent of the latest generate turn that had one, and the
+    # refine prompts issued since the latest generate turn
+    last_refined_intent: str = ""
+    refines_since_generate: List[str] = field(default_factory=list)
+
+    # Number of feedback turns, also kept current by add_turn()
+    feedback_count: int = 0
+
+    # to_gpt_messages() results: exclude_roles -> (messages, turns covered)
+    _message_cache: Dict[FrozenSet[str], Tuple[Tuple[Dict[str, str], ...], int]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
     @property
     def turn_count(self) -> int:
         return len(self.turns)
 
-    @property
-    def feedback_count(self) -> int:
-        return sum(1 for t in self.turns if t.role == "feedback")
-
     def add_turn(self, turn: ConversationTurn) -> None:
         self.turns.append(turn)
+        if turn.role == "feedback":
+            self.feedback_count += 1
+        elif turn.role == "generate":
+            if turn.refined_intent:
+                self.last_refined_intent = turn.refined_intent
+            self.refines_since_generate = []
+        elif turn.role == "refine":
+            self.refines_since_generate.append(turn.user_input)
 
     def to_gpt_messages(self, exclude_roles: Optional[List[str]] = None) -> List[Dict[str, str]]:
-        """Convert history into OpenAI chat message format."""
-        messages = []
-        for turn in self.turns:
-            if exclude_roles and turn.role in exclude_roles:
-                continue
-            if turn.role == "generate":
-                messages.append({
-                    "role": "user",
-                    "content": f"[Generation Request] {turn.user_input}"
-                })
-                messages.append({
-                    "role": "assistant",
-                    "content": (
-                        f"[Compiled Prompt]\n"
-                        f"Refined intent: {turn.refined_intent}\n"
-                        f"Negative constraints: {', '.join(turn.negative_constraints or [])}\n"
-                        f"Generated images: {', '.join(f'Image {i+1}' for i in range(len(turn.image_paths or [])))}"
-                    )
-                })
-            elif turn.role == "refine":
-                messages.append({
-                    "role": "user",
-                    "content": f"[Refinement] {turn.user_input}"
-                })
-                messages.append({
-                    "role": "assistant",
-                    "content": "[Refined sketches generated]"
-                })
-            elif turn.role == "feedback":
-                messages.append({
-                    "role": "user",
-                    "content": f"[Feedback] {turn.user_input}"
-                })
-        return messages
+        """
+        Convert history into OpenAI chat message format.
+
+        The result for each exclude_roles set is cached along with the number
+        of turns it covers, so each call only formats turns added since the last.
+        """
+        excluded = frozenset(exclude_roles or ())
+        messages, covered = self._message_cache.get(excluded, ((), 0))
+        new_messages = [
+            message
+            for turn in self.turns[covered:]
+            if turn.role not in excluded
+            for message in _turn_messages(turn)
+        ]
+        if new_messages or covered != len(self.turns):
+            # Replaced, never extended in place, so a concurrent caller
+            # can't see a half-updated list
+            messages = (*messages, *new_messages)
+            self._message_cache[excluded] = (messages, len(self.turns))
+        return list(messages)
 
     def get_feedback_texts(self) -> List[str]:
         """Get all feedback texts from this session."""
         return [t.user_input for t in self.turns if t.role == "feedback"]
 
 
+# "Image 1, Image 2, ..." for the image counts a generation can produce
+_IMAGE_LABELS = tuple(", ".join(f"Image {i+1}" for i in range(n)) for n in range(65))
+
+
+def _image_labels(count: int) -> str:
+    if count < len(_IMAGE_LABELS):
+        return _IMAGE_LABELS[count]
+    return ", ".join(f"Image {i+1}" for i in range(count))
+
+
+def _turn_messages(turn: ConversationTurn) -> List[Dict[str, str]]:
+    """The chat messages one turn contributes to the GPT history."""
+    if turn.role == "generate":
+        return [
+            {
+                "role": "user",
+                "content": f"[Generation Request] {turn.user_input}"
+            },
+            {
+                "role": "assistant",
+                "content": (
+                    f"[Compiled Prompt]\n"
+                    f"Refined intent: {turn.refined_intent}\n"
+                    f"Negative constraints: {', '.join(turn.negative_constraints or [])}\n"
+                    f"Generated images: {_image_labels(len(turn.image_paths or ()))}"
+                )
+            },
+        ]
+    if turn.role == "refine":
+        return [
+            {
+                "role": "user",
+                "content": f"[Refinement] {turn.user_input}"
+            },
+            {
+                "role": "assistant",
+                "content": "[Refined sketches generated]"
+            },
+        ]
+    if turn.role == "feedback":
+        return [{
+            "role": "user",
+            "content": f"[Feedback] {turn.user_input}"
+        }]
+    return []
+
+
 class SessionStore:
     """In-memory session state, keyed by (session_id, style_id)."""
 
     def __init__(self):
         self._sessions: Dict[str, ConversationContext] = {}
+        # Striped creation locks: two requests racing to open the same session
+        # get one shared context, while unrelated sessions rarely contend
+        self._locks = [threading.Lock() for _ in range(SESSION_LOCK_STRIPES)]
 
     def _key(self, session_id: str, style_id: str) -> str:
         return f"{session_id}::{style_id}"
 
     def get_or_create(self, session_id: str, style_id: str) -> ConversationContext:
         key = self._key(session_id, style_id)
-        if key not in self._sessions:
-            self._sessions[key] = ConversationContext(
-                session_id=session_id,
-                style_id=style_id
-            )
-        return self._sessions[key]
+        context = self._sessions.get(key)
+        if context is not None:
+            return context
+
+        with self._locks[hash(key) % SESSION_LOCK_STRIPES]:
+            context = self._sessions.get(key)
+            if context is None:
+                context = ConversationContext(
+                    session_id=session_id,
+                    style_id=style_id
+                )
+                self._sessions[key] = context
+        return context
 
     def reset(self, session_id: str, style_id: str) -> None:
         key = self._key(session_id, style_id)
@@ -42,10 +42,23 @@ Usage Example:
     print(f"Saved to: {result.timestamp}")
 """
 
+import importlib
+
 from .types import GenerationConfig, GenerationResult, GenerationPayload
-from .adapter import ImageModelAdapter
-from .nano_banana import NanaBananaAdapter
-from .generator import ImageGenerator
+
+# These pull in the Gemini SDK, so they load on first access (PEP 562)
+# and importing generate.types stays cheap
+_LAZY = {
+    "ImageModelAdapter": ".adapter",
+    "NanaBananaAdapter": ".nano_banana",
+    "ImageGenerator": ".generator",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     "GenerationConfig",
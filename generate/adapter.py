@@ -51,39 +51,61 @@ class ImageModelAdapter(ABC):
         Returns:
             Formatted prompt string for image generation
         """
-        # Build comprehensive prompt from PromptSpec
-        prompt = prompt_spec.refined_intent
-
-        # Add style information
-        prompt += f"\n\n**Style: {style.name}**\n{style.description}"
-
-        # Add visual rules from style
-        prompt += "\n\n**VISUAL RULES:**"
-        if isinstance(style.visual_rules, dict):
-            # Format dictionary as key-value pairs
-            for key, value in style.visual_rules.items():
-                if key != "additional_rules":
-                    prompt += f"\n- {key.replace('_', ' ').title()}: {value}"
-                elif isinstance(value, dict) and value:
-                    # Add additional_rules if present
-                    for rule_key, rule_value in value.items():
-                        prompt += f"\n- {rule_key.replace('_', ' ').title()}: {rule_value}"
-        else:
-            # Fallback for list format (if used in future)
-            for rule in style.visual_rules:
-                prompt += f"\n- {rule}"
+        # Build comprehensive prompt from PromptSpec, plus style information
+        # and visual rules (formatted once per style)
+        parts = [prompt_spec.refined_intent, _style_block(style)]
 
         # Add negative constraints if any
         if prompt_spec.negative_constraints:
             negative = ", ".join(prompt_spec.negative_constraints)
-            prompt += f"\n\n**Avoid:** {negative}"
+            parts.append(f"\n\n**Avoid:** {negative}")
 
         # Add mandatory grayscale enforcement
-        prompt += """
+        parts.append(_GRAYSCALE_BLOCK)
+
+        return "".join(parts)
+
+
+_GRAYSCALE_BLOCK = """
 
 **MANDATORY OUTPUT FORMAT:**
 - GRAYSCALE ONLY: Output must be black and white / grayscale
 - NO COLOR - use only black, white, and shades of gray
 - Render as a pencil/ink sketch on white paper"""
 
-        return prompt
+
+def _rule_label(key: str) -> str:
+    return key.replace('_', ' ').title()
+
+
+def _style_block(style) -> str:
+    """
+    The "**Style:**" and "**VISUAL RULES:**" sections of the prompt for a style.
+
+    Memoized on the Style object. The registry builds a new Style whenever a
+    style is edited, so the cache is checked against the identity of the
+    fields it was built from rather than their contents.
+    """
+    key = (style.name, style.description, id(style.visual_rules))
+    cached = getattr(style, "_prompt_block", None)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    lines = [f"\n\n**Style: {style.name}**\n{style.description}", "\n\n**VISUAL RULES:**"]
+    if isinstance(style.visual_rules, dict):
+        # Format dictionary as key-value pairs
+        for key_name, value in style.visual_rules.items():
+            if key_name != "additional_rules":
+                lines.append(f"\n- {_rule_label(key_name)}: {value}")
+            elif isinstance(value, dict) and value:
+                # Add additional_rules if present
+                for rule_key, rule_value in value.items():
+                    lines.append(f"\n- {_rule_label(rule_key)}: {rule_value}")
+    else:
+        # Fallback for list format (if used in future)
+        for rule in style.visual_rules:
+            lines.append(f"\n- {rule}")
+
+    block = "".join(lines)
+    style._prompt_block = (key, block)
+    return block
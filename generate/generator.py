@@ -1,5 +1,7 @@
 # generate/generator.py
-from typing import AsyncGenerator, List, Optional, Tuple
+import asyncio
+import os
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 from .adapter import ImageModelAdapter
 from .nano_banana import NanaBananaAdapter
 from .types import GenerationConfig, GenerationResult, GenerationPayload
@@ -63,60 +65,7 @@ class ImageGenerator:
         # Generate images via adapter
         image_paths, image_errors = self.adapter.generate(payload)
 
-        # Get timestamp for this generation
-        timestamp = get_timestamp()
-
-        # Extract reference image paths
-        reference_images = retrieval_result.to_dict()["images"]
-
-        # Create GenerationResult
-        result = GenerationResult(
-            images=image_paths,
-            image_errors=image_errors,
-            metadata_path="",  # Will be set after saving metadata
-            timestamp=timestamp,
-            prompt_spec=prompt_spec,
-            reference_images=reference_images,
-            config=config
-        )
-
-        # Save metadata
-        # Extract output directory from first successful image path
-        successful_paths = [p for p in image_paths if p is not None]
-        if successful_paths:
-            import os
-            output_dir = os.path.dirname(successful_paths[0])
-
-            # Prepare metadata dictionary
-            metadata_dict = {
-                "timestamp": timestamp,
-                "archived": False,
-                "user_prompt": prompt_spec.intent,
-                "gpt_compiled_prompt": prompt_spec.refined_intent,
-                "style": {
-                    "id": style.id,
-                    "name": style.name
-                },
-                "prompt_spec": prompt_spec.to_dict(),
-                "reference_images": reference_images,
-                "retrieval_scores": retrieval_result.scores,
-                "config": {
-                    "num_images": config.num_images,
-                    "resolution": list(config.resolution),
-                    "model_name": config.model_name,
-                    "seed": config.seed,
-                    "aspect_ratio": config.aspect_ratio,
-                    "image_size": config.image_size
-                },
-                "images": [os.path.basename(p) for p in successful_paths],
-                "image_errors": [e for e in image_errors if e is not None]
-            }
-
-            # Save metadata
-            metadata_path = save_metadata(metadata_dict, output_dir)
-            result.metadata_path = metadata_path
-
-        return result
+        return self._build_generate_result(payload, image_paths, image_errors)
 
     async def generate_async(
         self,
@@ -138,48 +87,13 @@ class ImageGenerator:
 
         image_paths, image_errors = await self.adapter.generate_async(payload)
 
-        timestamp = get_timestamp()
-        reference_images = retrieval_result.to_dict()["images"]
-
-        result = GenerationResult(
-            images=image_paths,
-            image_errors=image_errors,
-            metadata_path="",
-            timestamp=timestamp,
-            prompt_spec=prompt_spec,
-            reference_images=reference_images,
-            config=config
+        # Writes metadata.json, so keep it off the event loop. The write is
+        # awaited rather than left to a background task: the client confirms
+        # the generation, which reads metadata.json, as soon as it gets the result
+        return await asyncio.to_thread(
+            self._build_generate_result, payload, image_paths, image_errors
         )
 
-        successful_paths = [p for p in image_paths if p is not None]
-        if successful_paths:
-            import os
-            output_dir = os.path.dirname(successful_paths[0])
-            metadata_dict = {
-                "timestamp": timestamp,
-                "archived": False,
-                "user_prompt": prompt_spec.intent,
-                "gpt_compiled_prompt": prompt_spec.refined_intent,
-                "style": {"id": style.id, "name": style.name},
-                "prompt_spec": prompt_spec.to_dict(),
-                "reference_images": reference_images,
-                "retrieval_scores": retrieval_result.scores,
-                "config": {
-                    "num_images": config.num_images,
-                    "resolution": list(config.resolution),
-                    "model_name": config.model_name,
-                    "seed": config.seed,
-                    "aspect_ratio": config.aspect_ratio,
-                    "image_size": config.image_size
-                },
-                "images": [os.path.basename(p) for p in successful_paths],
-                "image_errors": [e for e in image_errors if e is not None]
-            }
-            metadata_path = save_metadata(metadata_dict, output_dir)
-            result.metadata_path = metadata_path
-
-        return result
-
     async def generate_streaming_async(
         self,
         prompt_spec: PromptSpec,
@@ -261,6 +175,104 @@ class ImageGenerator:
             config=config,
         )
 
+        return self._build_refine_result(
+            refine_prompt, original_context, refine_history,
+            source_image_paths, style, config, image_paths, image_errors
+        )
+
+    async def refine_async(
+        self,
+        refine_prompt: str,
+        original_context: str,
+        refine_history: List[str],
+        source_image_paths: List[str],
+        style,
+        config: Optional[GenerationConfig] = None,
+    ) -> GenerationResult:
+        """Async version of refine(). Collects the adapter's streamed results into one GenerationResult."""
+        if config is None:
+            config = GenerationConfig(num_images=len(source_image_paths))
+
+        image_paths: List[Optional[str]] = [None] * len(source_image_paths)
+        image_errors: List[Optional[str]] = [None] * len(source_image_paths)
+        async for idx, path, error in self.adapter.refine_streaming_async(
+            refine_prompt=refine_prompt,
+            original_context=original_context,
+            refine_history=refine_history,
+            source_image_paths=source_image_paths,
+            config=config,
+        ):
+            image_paths[idx] = path
+            image_errors[idx] = error
+
+        # Writes metadata.json (awaited, like generate_async), off the event loop
+        return await asyncio.to_thread(
+            self._build_refine_result,
+            refine_prompt, original_context, refine_history,
+            source_image_paths, style, config, image_paths, image_errors
+        )
+
+    def _build_generate_result(
+        self,
+        payload: GenerationPayload,
+        image_paths: List[Optional[str]],
+        image_errors: List[Optional[str]],
+    ) -> GenerationResult:
+        """Wrap generated image paths in a GenerationResult and save its metadata."""
+        timestamp = get_timestamp()
+        prompt_spec = payload.prompt_spec
+        config = payload.config
+
+        # Same list the adapter sent as references, extracted only once
+        reference_images = payload.reference_images
+
+        result = GenerationResult(
+            images=image_paths,
+            image_errors=image_errors,
+            metadata_path="",  # Will be set after saving metadata
+            timestamp=timestamp,
+            prompt_spec=prompt_spec,
+            reference_images=reference_images,
+            config=config
+        )
+
+        # Save metadata
+        successful_paths = [p for p in image_paths if p is not None]
+        if successful_paths:
+            metadata_dict = self._build_metadata(
+                timestamp, payload.style, successful_paths, image_errors,
+                config={
+                    "num_images": config.num_images,
+                    "resolution": list(config.resolution),
+                    "model_name": config.model_name,
+                    "seed": config.seed,
+                    "aspect_ratio": config.aspect_ratio,
+                    "image_size": config.image_size
+                },
+                user_prompt=prompt_spec.intent,
+                gpt_compiled_prompt=prompt_spec.refined_intent,
+                prompt_spec=prompt_spec.to_dict(),
+                reference_images=reference_images,
+                retrieval_scores=payload.retrieval_result.scores,
+            )
+
+            metadata_path = save_metadata(metadata_dict, os.path.dirname(successful_paths[0]))
+            result.metadata_path = metadata_path
+
+        return result
+
+    def _build_refine_result(
+        self,
+        refine_prompt: str,
+        original_context: str,
+        refine_history: List[str],
+        source_image_paths: List[str],
+        style,
+        config: GenerationConfig,
+        image_paths: List[Optional[str]],
+        image_errors: List[Optional[str]],
+    ) -> GenerationResult:
+        """Wrap refined image paths in a GenerationResult and save its metadata."""
         timestamp = get_timestamp()
 
         # Build a PromptSpec for metadata recording
@@ -282,32 +294,58 @@ class ImageGenerator:
         # Save metadata
         successful_paths = [p for p in image_paths if p is not None]
         if successful_paths:
-            import os
-            output_dir = os.path.dirname(successful_paths[0])
-
-            metadata_dict = {
-                "timestamp": timestamp,
-                "archived": False,
-                "mode": "refine",
-                "refine_prompt": refine_prompt,
-                "original_context": original_context,
-                "refine_history": refine_history,
-                "source_images": source_image_paths,
-                "style": {
-                    "id": style.id,
-                    "name": style.name,
-                },
-                "config": {
+            metadata_dict = self._build_metadata(
+                timestamp, style, successful_paths, image_errors,
+                config={
                     "num_images": config.num_images,
                     "resolution": list(config.resolution),
                     "model_name": config.model_name,
                     "aspect_ratio": config.aspect_ratio,
                 },
-                "images": [os.path.basename(p) for p in successful_paths],
-                "image_errors": [e for e in image_errors if e is not None],
-            }
-
-            metadata_path = save_metadata(metadata_dict, output_dir)
+                mode="refine",
+                refine_prompt=refine_prompt,
+                original_context=original_context,
+                refine_history=refine_history,
+                source_images=source_image_paths,
+            )
+
+            metadata_path = save_metadata(metadata_dict, os.path.dirname(successful_paths[0]))
             result.metadata_path = metadata_path
 
         return result
+
+    @staticmethod
+    def _build_metadata(
+        timestamp: str,
+        style,
+        successful_paths: List[str],
+        image_errors: List[Optional[str]],
+        config: Dict[str, Any],
+        **fields: Any,
+    ) -> Dict[str, Any]:
+        """
+        Assemble the metadata.json dict shared by generate and refine.
+
+        Args:
+            timestamp: Generation timestamp
+            style: Style object (only id and name are recorded)
+            successful_paths: Paths of the images that were saved
+            image_errors: Per-image error messages (None for success)
+            config: Summary of the GenerationConfig used
+            **fields: Mode-specific keys (prompts, references, scores, ...)
+
+        Returns:
+            Metadata dictionary ready for save_metadata()
+        """
+        return {
+            "timestamp": timestamp,
+            "archived": False,
+            **fields,
+            "style": {
+                "id": style.id,
+                "name": style.name,
+            },
+            "config": config,
+            "images": [os.path.basename(p) for p in successful_paths],
+            "image_errors": [e for e in image_errors if e is not None],
+        }
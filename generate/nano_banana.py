@@ -1,6 +1,7 @@
 # generate/nano_banana.py
 import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import AsyncGenerator, List, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
@@ -81,7 +82,7 @@ class NanaBananaAdapter(ImageModelAdapter):
         return self._generate_images(
             prompt=prompt,
             config=payload.config,
-            reference_images=payload.retrieval_result.to_dict()["images"]
+            reference_images=payload.reference_images
         )
 
     def _generate_images(
@@ -106,9 +107,8 @@ class NanaBananaAdapter(ImageModelAdapter):
         if self.client is None:
             raise RuntimeError("Image generation client not initialized. Set GOOGLE_API_KEY in your environment.")
 
-        # Create output directory with timestamp
-        timestamp = get_timestamp()
-        output_dir = create_output_directory(config.output_dir, timestamp)
+        # Create output directory with timestamp and name every sketch up front
+        output_paths = self._output_paths(config, config.num_images)
 
         print(f"Calling Nano Banana API...")
         print(f"  Prompt: {prompt[:80]}...")
@@ -131,22 +131,9 @@ class NanaBananaAdapter(ImageModelAdapter):
         success_indices = [i for i, data in enumerate(image_data_list) if data is not None]
 
         if success_indices:
-            def _process_and_save(i, data):
-                if config.enforce_grayscale:
-                    data = convert_to_grayscale(data)
-                out = Path(output_dir) / f"sketch_{i}.png"
-                with open(out, 'wb') as f:
-                    f.write(data)
-                # Validate the written file is complete and loadable
-                if not out.exists() or out.stat().st_size == 0:
-                    raise IOError(f"Image file was not written correctly")
-                PILImage.open(out).verify()
-                return str(out.absolute())
-
-            from concurrent.futures import ThreadPoolExecutor, as_completed
             with ThreadPoolExecutor(max_workers=len(success_indices)) as pool:
                 futures = {
-                    pool.submit(_process_and_save, i, image_data_list[i]): i
+                    pool.submit(self._process_and_save_single, image_data_list[i], output_paths[i], config): i
                     for i in success_indices
                 }
                 for future in as_completed(futures):
@@ -187,9 +174,8 @@ class NanaBananaAdapter(ImageModelAdapter):
         if self.client is None:
             raise RuntimeError("Image generation client not initialized. Set GOOGLE_API_KEY in your environment.")
 
-        # Create output directory with timestamp
-        timestamp = get_timestamp()
-        output_dir = create_output_directory(config.output_dir, timestamp)
+        # Create output directory with timestamp and name every sketch up front
+        output_paths = self._output_paths(config, len(source_image_paths))
 
         print(f"Calling Nano Banana API (refine mode)...")
         print(f"  Refine prompt: {refine_prompt[:80]}...")
@@ -208,22 +194,9 @@ class NanaBananaAdapter(ImageModelAdapter):
         success_indices = [i for i, data in enumerate(image_data_list) if data is not None]
 
         if success_indices:
-            def _process_and_save(i, data):
-                if config.enforce_grayscale:
-                    data = convert_to_grayscale(data)
-                out = Path(output_dir) / f"sketch_{i}.png"
-                with open(out, 'wb') as f:
-                    f.write(data)
-                # Validate the written file is complete and loadable
-                if not out.exists() or out.stat().st_size == 0:
-                    raise IOError(f"Image file was not written correctly")
-                PILImage.open(out).verify()
-                return str(out.absolute())
-
-            from concurrent.futures import ThreadPoolExecutor, as_completed
             with ThreadPoolExecutor(max_workers=len(success_indices)) as pool:
                 futures = {
-                    pool.submit(_process_and_save, i, image_data_list[i]): i
+                    pool.submit(self._process_and_save_single, image_data_list[i], output_paths[i], config): i
                     for i in success_indices
                 }
                 for future in as_completed(futures):
@@ -247,7 +220,7 @@ class NanaBananaAdapter(ImageModelAdapter):
         return await self._generate_images_async(
             prompt=prompt,
             config=payload.config,
-            reference_images=payload.retrieval_result.to_dict()["images"]
+            reference_images=payload.reference_images
         )
 
     async def _generate_images_async(
@@ -260,8 +233,7 @@ class NanaBananaAdapter(ImageModelAdapter):
         if self.client is None:
             raise RuntimeError("Image generation client not initialized. Set GOOGLE_API_KEY in your environment.")
 
-        timestamp = get_timestamp()
-        output_dir = create_output_directory(config.output_dir, timestamp)
+        output_paths = self._output_paths(config, config.num_images)
 
         print(f"Calling Nano Banana API (async)...")
         print(f"  Prompt: {prompt[:80]}...")
@@ -278,7 +250,7 @@ class NanaBananaAdapter(ImageModelAdapter):
         )
 
         # Save images (CPU-bound, use thread pool)
-        generated_paths = await self._save_images_async(image_data_list, output_dir, config)
+        generated_paths = await self._save_images_async(image_data_list, output_paths, config)
 
         success_count = sum(1 for p in generated_paths if p is not None)
         fail_count = sum(1 for e in image_errors if e is not None)
@@ -301,13 +273,12 @@ class NanaBananaAdapter(ImageModelAdapter):
         if self.client is None:
             raise RuntimeError("Image generation client not initialized. Set GOOGLE_API_KEY in your environment.")
 
-        timestamp = get_timestamp()
-        output_dir = create_output_directory(config.output_dir, timestamp)
-        reference_images = payload.retrieval_result.to_dict()["images"]
+        output_paths = self._output_paths(config, config.num_images)
+        reference_images = payload.reference_images
 
         print(f"Calling Nano Banana API (async streaming)...")
 
-        async for idx, img_bytes, error in self.client.generate_streaming_async(
+        stream = self.client.generate_streaming_async(
             prompt=prompt,
             reference_images=reference_images,
             num_images=config.num_images,
@@ -316,19 +287,9 @@ class NanaBananaAdapter(ImageModelAdapter):
             image_size=config.image_size,
             seed=config.seed,
             on_retry=on_retry
-        ):
-            if img_bytes is not None:
-                # Save this image (CPU-bound grayscale + disk write)
-                try:
-                    path = await asyncio.to_thread(
-                        self._process_and_save_single, idx, img_bytes, output_dir, config
-                    )
-                    yield (idx, path, None)
-                except Exception as save_err:
-                    print(f"[Streaming] Image {idx} save failed: {save_err}")
-                    yield (idx, None, f"Failed to save image: {save_err}")
-            else:
-                yield (idx, None, error)
+        )
+        async for item in self._save_streamed(stream, output_paths, config, "Streaming"):
+            yield item
 
     async def refine_streaming_async(
         self,
@@ -343,38 +304,85 @@ class NanaBananaAdapter(ImageModelAdapter):
         if self.client is None:
             raise RuntimeError("Image generation client not initialized. Set GOOGLE_API_KEY in your environment.")
 
-        timestamp = get_timestamp()
-        output_dir = create_output_directory(config.output_dir, timestamp)
+        output_paths = self._output_paths(config, len(source_image_paths))
 
         print(f"Calling Nano Banana API (refine streaming)...")
         print(f"  Refine prompt: {refine_prompt[:80]}...")
         print(f"  Source images: {len(source_image_paths)}")
 
-        async for idx, img_bytes, error in self.client.refine_streaming_async(
+        stream = self.client.refine_streaming_async(
             refine_prompt=refine_prompt,
             original_context=original_context,
             refine_history=refine_history,
             source_images=source_image_paths,
             aspect_ratio=config.aspect_ratio,
             on_retry=on_retry
-        ):
-            if img_bytes is not None:
-                try:
-                    path = await asyncio.to_thread(
-                        self._process_and_save_single, idx, img_bytes, output_dir, config
-                    )
-                    yield (idx, path, None)
-                except Exception as save_err:
-                    print(f"[Refine Streaming] Image {idx} save failed: {save_err}")
-                    yield (idx, None, f"Failed to save image: {save_err}")
-            else:
-                yield (idx, None, error)
+        )
+        async for item in self._save_streamed(stream, output_paths, config, "Refine Streaming"):
+            yield item
+
+    async def _save_streamed(
+        self,
+        stream: AsyncGenerator[Tuple[int, Optional[bytes], Optional[str]], None],
+        output_paths: List[Path],
+        config: GenerationConfig,
+        log_label: str
+    ) -> AsyncGenerator[Tuple[int, Optional[str], Optional[str]], None]:
+        """
+        Save images from a client stream concurrently, yielding (index, image_path, error)
+        as each save finishes.
 
-    def _process_and_save_single(self, index: int, data: bytes, output_dir: str, config: GenerationConfig) -> str:
-        """Process and save a single image. Thread-safe, used by async methods."""
+        Each save (grayscale conversion + disk write + verify) runs in its own thread
+        while the stream keeps being drained, so a slow save never holds back images
+        that arrive after it.
+        """
+        done: "asyncio.Queue[Optional[Tuple[int, Optional[str], Optional[str]]]]" = asyncio.Queue()
+
+        async def _save(idx: int, img_bytes: bytes):
+            try:
+                path = await asyncio.to_thread(
+                    self._process_and_save_single, img_bytes, output_paths[idx], config
+                )
+                done.put_nowait((idx, path, None))
+            except Exception as save_err:
+                print(f"[{log_label}] Image {idx} save failed: {save_err}")
+                done.put_nowait((idx, None, f"Failed to save image: {save_err}"))
+
+        async def _pump():
+            saves = []
+            try:
+                async for idx, img_bytes, error in stream:
+                    if img_bytes is not None:
+                        saves.append(asyncio.create_task(_save(idx, img_bytes)))
+                    else:
+                        done.put_nowait((idx, None, error))
+                await asyncio.gather(*saves)
+            finally:
+                for task in saves:
+                    task.cancel()
+                done.put_nowait(None)  # Sentinel: nothing more to yield
+
+        pump = asyncio.create_task(_pump())
+        try:
+            while True:
+                item = await done.get()
+                if item is None:
+                    break
+                yield item
+            await pump  # Surface errors raised by the client stream
+        finally:
+            pump.cancel()
+
+    @staticmethod
+    def _output_paths(config: GenerationConfig, count: int) -> List[Path]:
+        """Create a timestamped output directory and return the sketch_<i>.png path for each image."""
+        output_dir = Path(create_output_directory(config.output_dir, get_timestamp())).absolute()
+        return [output_dir / f"sketch_{i}.png" for i in range(count)]
+
+    def _process_and_save_single(self, data: bytes, out: Path, config: GenerationConfig) -> str:
+        """Process and save a single image. Thread-safe, used by every save path."""
         if config.enforce_grayscale:
             data = convert_to_grayscale(data)
-        out = Path(output_dir) / f"sketch_{index}.png"
         with open(out, 'wb') as f:
             f.write(data)
         # Validate the written file is complete and loadable
@@ -382,25 +390,29 @@ class NanaBananaAdapter(ImageModelAdapter):
             raise IOError(f"Image file was not written correctly")
         
         PILImage.open(out).verify()
-        return str(out.absolute())
+        return str(out)
 
     async def _save_images_async(
         self,
         image_data_list: List[Optional[bytes]],
-        output_dir: str,
+        output_paths: List[Path],
         config: GenerationConfig
     ) -> List[Optional[str]]:
         """Save images using asyncio.to_thread for CPU-bound work."""
         generated_paths: List[Optional[str]] = [None] * len(image_data_list)
-        tasks = []
-        for i, data in enumerate(image_data_list):
-            if data is not None:
-                tasks.append((i, asyncio.to_thread(self._process_and_save_single, i, data, output_dir, config)))
-
-        for i, task in tasks:
-            try:
-                generated_paths[i] = await task
-            except Exception as e:
-                print(f"[SaveAsync] Image {i} save failed: {e}")
+        indices = [i for i, data in enumerate(image_data_list) if data is not None]
+
+        # to_thread coroutines don't start until awaited, so gather them to
+        # overlap the saves instead of running them one after another
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._process_and_save_single, image_data_list[i], output_paths[i], config)
+              for i in indices),
+            return_exceptions=True
+        )
+        for i, result in zip(indices, results):
+            if isinstance(result, Exception):
+                print(f"[SaveAsync] Image {i} save failed: {result}")
+            else:
+                generated_paths[i] = result
 
         return generated_paths
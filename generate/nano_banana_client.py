@@ -133,6 +133,69 @@ SYSTEM_PROMPT = """You are a sketch assistant creating mascot/character patterns
 """
 
 
+# Appended to every generation prompt (the style constraints come from format_prompt())
+GENERATE_OUTPUT_REQUIREMENTS = """
+IMPORTANT OUTPUT REQUIREMENTS:
+- Generate exactly 1 single design image (not multiple designs in one image)
+- Match the layout, style, and technique shown in the reference images below
+- Do NOT include any text, words, letters, or numbers in the generated image
+- OUTPUT MUST BE BLACK AND WHITE / GRAYSCALE ONLY - NO COLOR
+"""
+
+REFINE_HISTORY_NOTE = "The sketch may already reflect previous refinements — do not undo them."
+REFINE_OUTPUT_REQUIREMENTS = "\nOutput a single modified sketch. GRAYSCALE ONLY — no color.\n"
+
+
+def _generate_prompt(prompt: str) -> str:
+    """Wrap a formatted generation prompt with the fixed output requirements."""
+    return "\n" + prompt + "\n" + GENERATE_OUTPUT_REQUIREMENTS
+
+
+def _refine_prompt(refine_prompt: str, original_context: str, refine_history: Optional[List[str]]) -> str:
+    """Build the edit prompt sent alongside each source sketch."""
+    history_section = ""
+    if refine_history:
+        items = "\n".join(f"  {i+1}. {h}" for i, h in enumerate(refine_history))
+        history_section = f"\nPREVIOUS REFINEMENTS ALREADY APPLIED:\n{items}\n"
+
+    return (
+        "EXISTING SKETCH: The attached image is the sketch to modify.\n\n"
+        f"ORIGINAL DESIGN CONTEXT: {original_context}\n"
+        f"{history_section}\n"
+        f"CURRENT MODIFICATION INSTRUCTIONS: {refine_prompt}\n\n"
+        "Apply ONLY the current modification instructions to the existing sketch.\n"
+        + (REFINE_HISTORY_NOTE if refine_history else "")
+        + REFINE_OUTPUT_REQUIREMENTS
+    )
+
+
+def _load_reference_bytes(reference_images: List[str]) -> List[bytes]:
+    """Read and verify up to 3 reference images, skipping any that fail to load."""
+    ref_image_bytes = []
+    for img_path in reference_images[:3]:
+        try:
+            with open(img_path, 'rb') as f:
+                data = f.read()
+            Image.open(BytesIO(data)).verify()
+            ref_image_bytes.append(data)
+        except Exception as e:
+            print(f"Warning: Failed to load reference image {img_path}: {e}")
+    return ref_image_bytes
+
+
+def _load_source_bytes(source_images: List[str]) -> List[Optional[bytes]]:
+    """Read each source sketch; None marks one that could not be loaded."""
+    source_image_bytes_list = []
+    for p in source_images:
+        try:
+            with open(p, 'rb') as f:
+                source_image_bytes_list.append(f.read())
+        except Exception as e:
+            print(f"Warning: Failed to load source image {p}: {e}")
+            source_image_bytes_list.append(None)
+    return source_image_bytes_list
+
+
 class NanaBananaClient:
     """Client for Google Gemini image generation."""
 
@@ -150,9 +213,18 @@ class NanaBananaClient:
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment")
 
-        # Initialize Gemini client
+        # Initialize Gemini client (one per process; its sync and async
+        # transports keep pooled connections that every call reuses)
         self.client = genai.Client(api_key=self.api_key)
 
+    def close(self) -> None:
+        """Release the sync transport's pooled connections."""
+        self.client.close()
+
+    async def aclose(self) -> None:
+        """Release the async transport (used by every *_async call)."""
+        await self.client.aio.aclose()
+
     def generate(
         self,
         prompt: str,
@@ -182,32 +254,12 @@ class NanaBananaClient:
               - Success: image_data_list[i] = bytes, errors_list[i] = None
               - Failure: image_data_list[i] = None, errors_list[i] = error message string
         """
-        # Filter to valid reference image paths (limit to 5)
-        valid_ref_paths = []
-        for img_path in reference_images[:3]:
-            try:
-                Image.open(img_path).verify()
-                valid_ref_paths.append(img_path)
-            except Exception as e:
-                print(f"Warning: Failed to load reference image {img_path}: {e}")
-
         # Build enhanced prompt with reference instruction
         # Note: style constraints are now in the prompt from format_prompt()
-        enhanced_prompt = f"""
-{prompt}
-
-IMPORTANT OUTPUT REQUIREMENTS:
-- Generate exactly 1 single design image (not multiple designs in one image)
-- Match the layout, style, and technique shown in the reference images below
-- Do NOT include any text, words, letters, or numbers in the generated image
-- OUTPUT MUST BE BLACK AND WHITE / GRAYSCALE ONLY - NO COLOR
-"""
+        enhanced_prompt = _generate_prompt(prompt)
 
         # Pre-load reference image bytes once (avoid redundant disk reads per thread)
-        ref_image_bytes = []
-        for p in valid_ref_paths:
-            with open(p, 'rb') as f:
-                ref_image_bytes.append(f.read())
+        ref_image_bytes = _load_reference_bytes(reference_images)
 
         # Generate all images in parallel using threads, staggered to avoid rate limits
         # Each thread creates its own PIL Image from pre-loaded bytes (thread-safe)
@@ -365,31 +417,10 @@ IMPORTANT OUTPUT REQUIREMENTS:
             Tuple of (image_data_list, errors_list) with len == len(source_images)
         """
         # Build refine-specific enhanced prompt
-        history_section = ""
-        if refine_history:
-            items = "\n".join(f"  {i+1}. {h}" for i, h in enumerate(refine_history))
-            history_section = f"\nPREVIOUS REFINEMENTS ALREADY APPLIED:\n{items}\n"
-
-        enhanced_prompt = f"""EXISTING SKETCH: The attached image is the sketch to modify.
-
-ORIGINAL DESIGN CONTEXT: {original_context}
-{history_section}
-CURRENT MODIFICATION INSTRUCTIONS: {refine_prompt}
-
-Apply ONLY the current modification instructions to the existing sketch.
-{("The sketch may already reflect previous refinements — do not undo them." if refine_history else "")}
-Output a single modified sketch. GRAYSCALE ONLY — no color.
-"""
+        enhanced_prompt = _refine_prompt(refine_prompt, original_context, refine_history)
 
         # Pre-load each source image as bytes
-        source_image_bytes_list = []
-        for p in source_images:
-            try:
-                with open(p, 'rb') as f:
-                    source_image_bytes_list.append(f.read())
-            except Exception as e:
-                print(f"Warning: Failed to load source image {p}: {e}")
-                source_image_bytes_list.append(None)
+        source_image_bytes_list = _load_source_bytes(source_images)
 
         num_images = len(source_images)
         print(f"Refining {num_images} image(s) in parallel...")
@@ -624,28 +655,10 @@ Output a single modified sketch. GRAYSCALE ONLY — no color.
         temperature: float = 0.8
     ) -> Tuple[List[Optional[bytes]], List[Optional[str]]]:
         """Async version of generate() using asyncio.gather()."""
-        valid_ref_paths = []
-        for img_path in reference_images[:3]:
-            try:
-                Image.open(img_path).verify()
-                valid_ref_paths.append(img_path)
-            except Exception as e:
-                print(f"Warning: Failed to load reference image {img_path}: {e}")
+        enhanced_prompt = _generate_prompt(prompt)
 
-        enhanced_prompt = f"""
-{prompt}
-
-IMPORTANT OUTPUT REQUIREMENTS:
-- Generate exactly 1 single design image (not multiple designs in one image)
-- Match the layout, style, and technique shown in the reference images below
-- Do NOT include any text, words, letters, or numbers in the generated image
-- OUTPUT MUST BE BLACK AND WHITE / GRAYSCALE ONLY - NO COLOR
-"""
-
-        ref_image_bytes = []
-        for p in valid_ref_paths:
-            with open(p, 'rb') as f:
-                ref_image_bytes.append(f.read())
+        # Disk reads and PIL verification would stall the event loop
+        ref_image_bytes = await asyncio.to_thread(_load_reference_bytes, reference_images)
 
         print(f"Generating {num_images} images in parallel (async)...")
 
@@ -687,28 +700,10 @@ IMPORTANT OUTPUT REQUIREMENTS:
         on_retry=None
     ) -> AsyncGenerator[Tuple[int, Optional[bytes], Optional[str]], None]:
         """Async streaming generator that yields (index, image_bytes, error) as each image completes."""
-        valid_ref_paths = []
-        for img_path in reference_images[:3]:
-            try:
-                Image.open(img_path).verify()
-                valid_ref_paths.append(img_path)
-            except Exception as e:
-                print(f"Warning: Failed to load reference image {img_path}: {e}")
+        enhanced_prompt = _generate_prompt(prompt)
 
-        enhanced_prompt = f"""
-{prompt}
-
-IMPORTANT OUTPUT REQUIREMENTS:
-- Generate exactly 1 single design image (not multiple designs in one image)
-- Match the layout, style, and technique shown in the reference images below
-- Do NOT include any text, words, letters, or numbers in the generated image
-- OUTPUT MUST BE BLACK AND WHITE / GRAYSCALE ONLY - NO COLOR
-"""
-
-        ref_image_bytes = []
-        for p in valid_ref_paths:
-            with open(p, 'rb') as f:
-                ref_image_bytes.append(f.read())
+        # Disk reads and PIL verification would stall the event loop
+        ref_image_bytes = await asyncio.to_thread(_load_reference_bytes, reference_images)
 
         print(f"Generating {num_images} images in parallel (async streaming)...")
 
@@ -814,31 +809,10 @@ IMPORTANT OUTPUT REQUIREMENTS:
     ) -> AsyncGenerator[Tuple[int, Optional[bytes], Optional[str]], None]:
         """Async streaming refine that yields (index, image_bytes, error) as each image completes."""
         # Build refine-specific enhanced prompt
-        history_section = ""
-        if refine_history:
-            items = "\n".join(f"  {i+1}. {h}" for i, h in enumerate(refine_history))
-            history_section = f"\nPREVIOUS REFINEMENTS ALREADY APPLIED:\n{items}\n"
+        enhanced_prompt = _refine_prompt(refine_prompt, original_context, refine_history)
 
-        enhanced_prompt = f"""EXISTING SKETCH: The attached image is the sketch to modify.
-
-ORIGINAL DESIGN CONTEXT: {original_context}
-{history_section}
-CURRENT MODIFICATION INSTRUCTIONS: {refine_prompt}
-
-Apply ONLY the current modification instructions to the existing sketch.
-{("The sketch may already reflect previous refinements — do not undo them." if refine_history else "")}
-Output a single modified sketch. GRAYSCALE ONLY — no color.
-"""
-
-        # Pre-load each source image as bytes
-        source_image_bytes_list = []
-        for p in source_images:
-            try:
-                with open(p, 'rb') as f:
-                    source_image_bytes_list.append(f.read())
-            except Exception as e:
-                print(f"Warning: Failed to load source image {p}: {e}")
-                source_image_bytes_list.append(None)
+        # Pre-load each source image as bytes, off the event loop
+        source_image_bytes_list = await asyncio.to_thread(_load_source_bytes, source_images)
 
         num_images = len(source_images)
         print(f"Refining {num_images} image(s) in parallel (async streaming)...")
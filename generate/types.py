@@ -59,3 +59,11 @@ class GenerationPayload:
     retrieval_result: RetrievalResult  # RAG references
     config: GenerationConfig  # Generation parameters
     style: object  # Style object with name, description, visual_rules
+    cached_reference_images: Optional[List[str]] = None  # Filled on first reference_images access
+
+    @property
+    def reference_images(self) -> List[str]:
+        """Reference image paths, extracted from retrieval_result once per payload"""
+        if self.cached_reference_images is None:
+            self.cached_reference_images = self.retrieval_result.to_dict()["images"]
+        return self.cached_reference_images
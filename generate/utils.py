@@ -1,8 +1,8 @@
 # generate/utils.py
-import json
 from pathlib import Path
 from typing import Tuple
 from datetime import datetime
+import orjson
 from PIL import Image
 
 
@@ -44,8 +44,9 @@ def save_metadata(metadata_dict: dict, output_dir: str) -> str:
         Path to saved metadata file
     """
     metadata_path = Path(output_dir) / "metadata.json"
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata_dict, f, indent=2)
+    # One write of pre-encoded bytes; same 2-space layout as json.dump(indent=2)
+    with open(metadata_path, 'wb') as f:
+        f.write(orjson.dumps(metadata_dict, option=orjson.OPT_INDENT_2))
     return str(metadata_path.absolute())
 
 
@@ -1,13 +1,21 @@
 # prompt/compiler.py
+import hashlib
 import json
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 from openai import OpenAI
 from .schema import PromptSpec
 
 # Configuration
-TEMPERATURE = 0.7  # GPT temperature: some creativity but mostly consistent
+TEMPERATURE = float(os.getenv("GPT_TEMPERATURE", "0.7"))  # GPT temperature: some creativity but mostly consistent
+# Compiled prompts are only cached when TEMPERATURE is 0. Above that, repeating
+# an input is expected to give a different prompt, so every call goes to GPT.
+COMPILE_CACHE_SIZE = int(os.getenv("COMPILE_CACHE_SIZE", "256"))  # Compiled prompts kept in memory (0 disables)
+COMPILE_CACHE_TTL = float(os.getenv("COMPILE_CACHE_TTL", "3600"))  # Seconds a compiled prompt is reused before GPT is asked again
 
 class PromptCompiler:
     """
@@ -35,6 +43,11 @@ class PromptCompiler:
         self.model = model
         self.client = OpenAI(api_key=api_key) if api_key else OpenAI()
 
+        # (expiry, GPT result) keyed by a digest of the exact request messages,
+        # so a change to the input, style context or history is a different key
+        self._cache: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
     @staticmethod
     def _load_system_prompt() -> str:
         """Load the system prompt from the default file."""
@@ -58,6 +71,9 @@ class PromptCompiler:
 
         Returns:
             PromptSpec: Structured, model-agnostic prompt specification
+
+        Results are reused for identical requests only when TEMPERATURE is 0
+        (see COMPILE_CACHE_SIZE / COMPILE_CACHE_TTL).
         """
         # Prepare context for the LLM
         style_context = {
@@ -77,24 +93,62 @@ class PromptCompiler:
             messages.extend(conversation_history)
         messages.append({"role": "user", "content": user_prompt})
 
-        # Call GPT to interpret and structure the prompt
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=TEMPERATURE,
-            response_format={"type": "json_object"}
-        )
-
-        # Parse the structured response
-        result = json.loads(response.choices[0].message.content)
+        # At temperature 0 GPT is deterministic, so an identical request can
+        # reuse the earlier result; otherwise always sample a fresh prompt
+        cacheable = TEMPERATURE == 0 and COMPILE_CACHE_SIZE > 0
+        key = self._cache_key(messages) if cacheable else None
+        result = self._lookup(key) if cacheable else None
+
+        if result is None:
+            # Call GPT to interpret and structure the prompt
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                response_format={"type": "json_object"}
+            )
+
+            # Parse the structured response
+            result = json.loads(response.choices[0].message.content)
+            if cacheable:
+                self._remember(key, result)
 
         # Build and return the PromptSpec
         return PromptSpec(
             intent=user_text,
             refined_intent=result.get("refined_intent", user_text),
-            negative_constraints=result.get("negative_constraints", [])
+            negative_constraints=list(result.get("negative_constraints", []))
         )
 
+    def _cache_key(self, messages: List[Dict[str, str]]) -> bytes:
+        """Digest of the model and every message's role and content, fed to blake2b piece by piece."""
+        digest = hashlib.blake2b(self.model.encode(), digest_size=16)
+        for message in messages:
+            # NUL separators keep ("ab", "c") and ("a", "bc") from colliding
+            digest.update(b"\0" + message["role"].encode() + b"\0" + message["content"].encode())
+        return digest.digest()
+
+    def _lookup(self, key: bytes) -> Optional[Dict[str, Any]]:
+        """Return the cached GPT result for key unless it is missing or past COMPILE_CACHE_TTL."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return result
+
+    def _remember(self, key: bytes, result: Dict[str, Any]) -> None:
+        """Store a GPT result, evicting the least recently used past COMPILE_CACHE_SIZE."""
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + COMPILE_CACHE_TTL, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > COMPILE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
     def _build_compilation_request(self, user_text: str, style_context: dict) -> str:
         """
         Build the prompt for the LLM to compile the user's natural language.
@@ -1,7 +1,21 @@
+import importlib
+
 from .types import ReferenceImage, ImageEmbedding, RetrievalResult, RetrievalConfig
-from .embedder import ImageEmbedder
-from .index import StyleImageIndex, IndexRegistry
-from .retriever import ImageRetriever
+
+# These pull in torch/transformers, so they load on first access (PEP 562)
+# and importing rag.types stays cheap
+_LAZY = {
+    "ImageEmbedder": ".embedder",
+    "StyleImageIndex": ".index",
+    "IndexRegistry": ".index",
+    "ImageRetriever": ".retriever",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     "ReferenceImage",
@@ -224,7 +224,14 @@ class ImageEmbedder:
 
         # Generate embeddings
         with torch.no_grad():
-            image_features = self.model.get_image_features(**inputs)
+            outputs = self.model.get_image_features(**inputs)
+
+        # Handle different transformers versions (same as single-image embedding)
+        if isinstance(outputs, torch.Tensor):
+            image_features = outputs
+        else:
+            # BaseModelOutputWithPooling - get pooler_output
+            image_features = outputs.pooler_output
 
         # Convert to lists and normalize
         embeddings = image_features.cpu().numpy().tolist()
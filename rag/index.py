@@ -1,6 +1,7 @@
 import json
+import os
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime
 
 from .types import ImageEmbedding
@@ -75,29 +76,111 @@ class StyleImageIndex:
                 f"Run: python -m rag.init_embeddings --style {self.style_id} --force"
             )
 
-    def build_index(self) -> List[ImageEmbedding]:
-        """Generate embeddings for all reference images in style"""
+    def build_index(self, batch_size: int = 32, reuse_cached: bool = False) -> List[ImageEmbedding]:
+        """
+        Generate embeddings for all reference images in style.
+
+        Images are embedded batch_size at a time, one model forward pass per batch.
+        With reuse_cached, images that already have a vector in this style's
+        cache keep it and only the rest are embedded. Reference images get a
+        fresh UUID filename on every upload, so a cached path always refers to
+        the same image content.
+        """
         style = self.style_registry.get_style(self.style_id)
 
         if not style.reference_images:
             print(f"Warning: Style {self.style_id} has no reference images")
             return []
 
-        embeddings = []
-        for img_path in style.reference_images:
-            # Generate embedding
-            embedding_vector = self.embedder.embed_image(img_path)
+        vectors = self._cached_vectors() if reuse_cached else {}
+        to_embed = [path for path in style.reference_images if path not in vectors]
+
+        for start in range(0, len(to_embed), batch_size):
+            batch_paths = to_embed[start:start + batch_size]
+            vectors.update(zip(batch_paths, self.embedder.embed_batch(batch_paths)))
 
-            # Create ImageEmbedding object
-            img_embedding = ImageEmbedding(
+        embeddings = [
+            ImageEmbedding(
                 image_path=img_path,
-                embedding=embedding_vector,
+                embedding=vectors[img_path],
                 style_id=self.style_id
             )
-            embeddings.append(img_embedding)
+            for img_path in style.reference_images
+        ]
 
         # Cache the results
         self._save_to_cache(embeddings)
+        self._embeddings = embeddings
+
+        return embeddings
+
+    def _cached_vectors(self) -> Dict[str, List[float]]:
+        """Map each cached image path to its embedding; empty if there is no usable cache."""
+        try:
+            embeddings = self.get_embeddings()
+        except ValueError:
+            return {}
+        return {emb.image_path: emb.embedding for emb in embeddings}
+
+    def add_images(self, image_paths: List[str], batch_size: int = 32) -> List[ImageEmbedding]:
+        """
+        Embed only the given new images and append them to the cached index.
+
+        Falls back to a full build_index() when there is no usable cache yet.
+        Paths already in the index are not embedded again.
+        """
+        try:
+            existing = self.get_embeddings()
+        except ValueError:
+            return self.build_index(batch_size=batch_size)
+
+        # Already-indexed paths keep their vectors; only the rest hit the model
+        indexed = {emb.image_path for emb in existing}
+        new_paths = [path for path in image_paths if path not in indexed]
+        if not new_paths:
+            return existing
+
+        added = []
+        for start in range(0, len(new_paths), batch_size):
+            batch_paths = new_paths[start:start + batch_size]
+            vectors = self.embedder.embed_batch(batch_paths)
+
+            added.extend(
+                ImageEmbedding(
+                    image_path=img_path,
+                    embedding=embedding_vector,
+                    style_id=self.style_id
+                )
+                for img_path, embedding_vector in zip(batch_paths, vectors)
+            )
+
+        # New list rather than in-place extend, so concurrent readers of the
+        # old one never see a half-appended index
+        embeddings = existing + added
+        self._save_to_cache(embeddings)
+        self._embeddings = embeddings
+
+        return embeddings
+
+    def remove_images(self, filenames: Iterable[str]) -> List[ImageEmbedding]:
+        """
+        Drop the entries for the given reference image filenames from the cached index.
+
+        No image is re-embedded; the remaining entries keep their vectors and order.
+        Does nothing when there is no usable cache yet.
+        """
+        try:
+            existing = self.get_embeddings()
+        except ValueError:
+            return []
+
+        names = set(filenames)
+        embeddings = [emb for emb in existing if os.path.basename(emb.image_path) not in names]
+        if len(embeddings) == len(existing):
+            return existing
+
+        self._save_to_cache(embeddings)
+        self._embeddings = embeddings
 
         return embeddings
 
@@ -26,8 +26,9 @@ import hashlib
 import json
 import shutil
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
 from uuid import uuid4
 
@@ -82,6 +83,23 @@ def compute_image_hash(file_path: Path) -> str:
     return h.hexdigest()
 
 
+# Reference images are UUID-named and never rewritten, so their hashes are
+# cached by (path, size, mtime) instead of re-reading every file per add.
+# LRU-bounded, so hashes of deleted references age out instead of piling up.
+REFERENCE_HASH_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=REFERENCE_HASH_CACHE_SIZE)
+def _reference_hash(path: str, size: int, mtime_ns: int) -> str:
+    return compute_image_hash(Path(path))
+
+
+def cached_image_hash(file_path: Path) -> str:
+    """compute_image_hash() memoized on the file's path, size and mtime."""
+    stat = file_path.stat()
+    return _reference_hash(str(file_path), stat.st_size, stat.st_mtime_ns)
+
+
 def move_images(
     image_files: List[Path],
     rag_images_dir: Path = Path("rag/reference_images")
@@ -128,6 +146,43 @@ def move_images(
         raise RuntimeError(f"Failed to move images: {e}")
 
 
+def write_image_blobs(
+    image_blobs: List[Tuple[str, bytes]],
+    rag_images_dir: Path = Path("rag/reference_images")
+) -> List[str]:
+    """
+    Write in-memory images, given as (original_filename, content) pairs, to
+    rag/reference_images/ with UUID-based filenames. Counterpart of
+    move_images() for uploads that never touched disk.
+    """
+    rag_images_dir.mkdir(parents=True, exist_ok=True)
+
+    new_filenames = []
+
+    try:
+        for original_name, data in image_blobs:
+            suffix = Path(original_name).suffix.lower()
+            new_filename = f"{uuid4()}{suffix}"
+
+            # Exclusive create: fails on a (practically impossible) UUID
+            # collision instead of stat-ing the directory before every write
+            with open(rag_images_dir / new_filename, "xb") as f:
+                f.write(data)
+            new_filenames.append(new_filename)
+
+        return new_filenames
+
+    except Exception as e:
+        # Rollback: remove files written so far
+        print(f"Error writing images: {e}")
+        print("Rolling back changes...")
+
+        for filename in new_filenames:
+            (rag_images_dir / filename).unlink(missing_ok=True)
+
+        raise RuntimeError(f"Failed to write images: {e}")
+
+
 def update_style_json(
     style_id: str,
     updates: Dict[str, Any],
@@ -174,10 +229,14 @@ def create_new_style(
     description: str,
     image_files: List[Path],
     visual_rules: Dict[str, Any],
-    style_library_root: Path = Path("style/style_library")
+    style_library_root: Path = Path("style/style_library"),
+    image_blobs: Optional[List[Tuple[str, bytes]]] = None
 ) -> Path:
     """
     Create a new style with images.
+
+    image_blobs holds (filename, content) pairs for images received in memory;
+    they are written to the reference store alongside the moved image_files.
     """
     # Check that style_id doesn't already exist
     style_dir = style_library_root / style_id
@@ -198,6 +257,8 @@ def create_new_style(
 
         # Move images and get filenames
         new_filenames = move_images(image_files)
+        if image_blobs:
+            new_filenames += write_image_blobs(image_blobs)
 
         # Create style.json content
         style_data = {
@@ -226,11 +287,15 @@ def add_images_to_existing_style(
     style_id: str,
     image_files: List[Path],
     style_library_root: Path = Path("style/style_library"),
-    rag_images_dir: Path = Path("rag/reference_images")
+    rag_images_dir: Path = Path("rag/reference_images"),
+    image_blobs: Optional[List[Tuple[str, bytes]]] = None
 ) -> Tuple[int, int]:
     """
     Add images to an existing style, skipping duplicates by content hash.
 
+    image_blobs holds (filename, content) pairs for images received in memory;
+    they are hashed in place and only novel ones are written to disk.
+
     Returns:
         Tuple of (added_count, skipped_count)
     """
@@ -251,7 +316,7 @@ def add_images_to_existing_style(
         for img_filename in current_images:
             img_path = rag_images_dir / img_filename
             if img_path.exists():
-                existing_hashes.add(compute_image_hash(img_path))
+                existing_hashes.add(cached_image_hash(img_path))
 
         # Filter out duplicates
         unique_files = []
@@ -264,11 +329,22 @@ def add_images_to_existing_style(
                 existing_hashes.add(h)  # prevent intra-batch duplicates
                 unique_files.append(image_file)
 
-        if not unique_files:
+        unique_blobs = []
+        for blob in image_blobs or []:
+            h = hashlib.sha256(blob[1]).hexdigest()
+            if h in existing_hashes:
+                skipped += 1
+            else:
+                existing_hashes.add(h)
+                unique_blobs.append(blob)
+
+        if not unique_files and not unique_blobs:
             return 0, skipped
 
-        # Move only unique images
+        # Move / write only unique images
         new_filenames = move_images(unique_files, rag_images_dir)
+        if unique_blobs:
+            new_filenames += write_image_blobs(unique_blobs, rag_images_dir)
 
         # Append to reference_images
         updated_images = current_images + new_filenames
@@ -31,8 +31,9 @@ class StyleRegistry:
 
         # Resolve reference image paths relative to rag/reference_images/
         rag_images_dir = Path("rag/reference_images")
+        reference_image_names = data.get("reference_images", [])
         reference_images = [
-            str(rag_images_dir / img) for img in data.get("reference_images", [])
+            str(rag_images_dir / img) for img in reference_image_names
         ]
 
         # Validate that all images exist
@@ -59,7 +60,8 @@ class StyleRegistry:
             visual_rules=visual_rules,
             reference_images=reference_images,
             do_not_use=do_not_use,
-            feedback_summary=data.get("feedback_summary")
+            feedback_summary=data.get("feedback_summary"),
+            reference_image_names=[Path(img).name for img in reference_image_names]
         )
 
         self._cache[style_id] = style
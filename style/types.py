@@ -1,4 +1,5 @@
 # style/types.py
+import os
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 
@@ -11,4 +12,9 @@ class Style:
     visual_rules: Dict[str, Any]  # Visual constraints (line_weight, looseness, complexity, etc.)
     reference_images: List[str] = field(default_factory=list)  # Paths to curated reference images
     do_not_use: Optional[List[str]] = field(default_factory=list)  # Paths to excluded reference images
-    feedback_summary: Optional[str] = None  # GPT-summarized designer feedback for this style
\ No newline at end of file
+    feedback_summary: Optional[str] = None  # GPT-summarized designer feedback for this style
+    reference_image_names: List[str] = field(default_factory=list)  # Bare filenames of reference_images
+
+    def __post_init__(self):
+        if not self.reference_image_names and self.reference_images:
+            self.reference_image_names = [os.path.basename(p) for p in self.reference_images]
\ No newline at end of file